@@ -0,0 +1,598 @@
+"""
+Git Radio 离线性能基准
+
+在本地启动一个模拟的GitHub服务（REST JSON、trending HTML，可配置延迟和速率限制响应头）
+和一个OpenAI兼容的桩LLM，不访问真实网络，测量各阶段耗时和吞吐随仓库数量的变化。
+
+每个规模在独立子进程中运行（模块级配置、进程内缓存互不影响，模拟服务也不与被测代码争用GIL）：
+- cold: 全新缓存目录，依次测量 starred / events / trending / summary 各阶段
+- warm: 复用cold的缓存目录再跑一遍（ETag条件请求、starred增量同步、trending和摘要缓存）
+- pipeline: 全新缓存目录运行完整的 main()（未安装语音引擎时在TTS初始化处结束，不含语音合成）
+
+--tts 时改为测量MeloTTS各推理后端（torch / onnx / onnx-int8）在CPU上的实时率（RTF = 合成耗时 / 音频时长），
+每个后端同样在独立子进程中加载模型、预热一句后逐句合成固定文本（不使用音频缓存）
+
+用法:
+    python benchmark.py --sizes 10,100,1000,5000 --latency 20 --json bench.json
+    python benchmark.py --tts --threads 4 --rounds 3
+"""
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import tempfile
+import threading
+import subprocess
+from datetime import datetime, timedelta, timezone
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from typing import List, Dict, Any, Optional
+
+RESULT_PREFIX = 'BENCH_RESULT '
+
+# 模拟事件的类型分布（含非重要事件，以便测到过滤逻辑）
+EVENT_TYPE_WEIGHTS = [('PushEvent', 40), ('WatchEvent', 20), ('IssueCommentEvent', 12), ('PullRequestEvent', 10),
+                      ('IssuesEvent', 8), ('ForkEvent', 5), ('CreateEvent', 3), ('ReleaseEvent', 2)]
+
+
+# TTS基准的固定文本（中英混合，与实际播报的句长相近）
+TTS_BENCH_TEXT = (
+    "大家好，欢迎收听今天的Git Radio。"
+    "vscode合并了一个新的AI代码补全功能，评论区讨论非常热烈。"
+    "React发布了新版本，修复了并发渲染中的多个问题。"
+    "今天的trending榜单上，一个用Rust编写的终端工具获得了超过两千个star。"
+    "另外，pytorch的维护者提交了一组针对CPU推理的性能优化。"
+    "以上就是今天的播报，我们明天见。"
+)
+
+# 后端名 -> 子进程环境变量
+TTS_BACKENDS = {
+    'torch': {'TTS_BACKEND': 'torch'},
+    'onnx': {'TTS_BACKEND': 'onnx', 'ONNX_QUANTIZE': 'false'},
+    'onnx-int8': {'TTS_BACKEND': 'onnx', 'ONNX_QUANTIZE': 'true'},
+}
+
+
+def _iso(dt: datetime) -> str:
+    return dt.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+class FakeGitHub:
+    """
+    模拟的GitHub服务，数据按仓库序号确定性生成（同一实例多次请求内容一致，ETag稳定）：
+    - GET /user/starred                 按per_page/page分页并返回Link头
+    - GET /repos/{owner}/{repo}/events  每个仓库events_per_repo个事件，时间分布在过去72小时
+    - GET /repos/{owner}/{repo}/pulls   最近更新的PR，部分评论数较多
+    - GET /trending[/{language}]        与github.com结构一致的trending页面
+    - POST /v1/chat/completions         OpenAI兼容的桩LLM（支持stream）
+    """
+
+    def __init__(self, repo_count: int = 10, events_per_repo: int = 30, latency: float = 0.0,
+                 llm_latency: float = 0.5, rate_limit: int = 1000000, rate_window: float = 3600, seed: int = 0):
+        self.repo_count = repo_count
+        self.events_per_repo = events_per_repo
+        self.latency = latency
+        self.llm_latency = llm_latency
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.seed = seed
+        self.now = datetime.now(timezone.utc).replace(microsecond=0)
+        self._lock = threading.Lock()
+        self._body_cache = {}
+        self.reset()
+
+    # 清零计数器并重置速率限制窗口
+    def reset(self, repo_count: Optional[int] = None) -> None:
+        with self._lock:
+            if repo_count is not None and repo_count != self.repo_count:
+                self.repo_count = repo_count
+                self._body_cache.clear()
+            self.stats = {'requests': 0, 'not_modified': 0, 'rate_limited': 0, 'bytes': 0, 'llm_requests': 0}
+            self.remaining = self.rate_limit
+            self.rate_reset = time.time() + self.rate_window
+
+    # 占用一个速率限制额度，返回 (是否允许, 剩余额度, 重置时间)
+    def take_rate_limit(self, conditional_hit: bool):
+        with self._lock:
+            now = time.time()
+            if now >= self.rate_reset:
+                self.remaining = self.rate_limit
+                self.rate_reset = now + self.rate_window
+            # 与GitHub一致：命中ETag的304响应不消耗额度
+            if conditional_hit:
+                return True, self.remaining, self.rate_reset
+            if self.remaining <= 0:
+                self.stats['rate_limited'] += 1
+                return False, 0, self.rate_reset
+            self.remaining -= 1
+            return True, self.remaining, self.rate_reset
+
+    def count(self, key: str, value: int = 1) -> None:
+        with self._lock:
+            self.stats[key] += value
+
+    def repo_name(self, index: int) -> str:
+        return f'bench-org{index % 97}/repo{index}'
+
+    def starred_items(self) -> List[Dict[str, Any]]:
+        items = []
+        for i in range(self.repo_count):
+            rng = random.Random(self.seed * 1000003 + i)
+            pushed = self.now - timedelta(hours=rng.expovariate(1 / 48))
+            items.append({
+                'starred_at': _iso(self.now - timedelta(minutes=10 * i + 1)),
+                'repo': {
+                    'id': i + 1,
+                    'full_name': self.repo_name(i),
+                    'private': False,
+                    'description': f'Synthetic repository #{i} for benchmarking',
+                    'language': rng.choice(['Python', 'Rust', 'Go', 'TypeScript', 'C++']),
+                    'stargazers_count': int(rng.paretovariate(1.2) * 10),
+                    'updated_at': _iso(max(pushed, self.now - timedelta(hours=rng.uniform(0, 24)))),
+                    'pushed_at': _iso(pushed),
+                }
+            })
+        return items
+
+    def repo_events(self, full_name: str) -> List[Dict[str, Any]]:
+        rng = random.Random(f'{self.seed}:{full_name}')
+        types, weights = zip(*EVENT_TYPE_WEIGHTS)
+        created = self.now
+        events = []
+        for n in range(self.events_per_repo):
+            created -= timedelta(minutes=rng.expovariate(self.events_per_repo / (72 * 60)))
+            event_type = rng.choices(types, weights)[0]
+            actor = f'dev{rng.randrange(50)}'
+            if event_type == 'PushEvent':
+                payload = {'ref': 'refs/heads/main', 'size': 3, 'commits': [
+                    {'sha': hashlib.sha1(f'{full_name}{n}{c}'.encode()).hexdigest(),
+                     'message': f'Fix issue #{rng.randrange(1000)} in module {c}',
+                     'author': {'name': actor, 'email': f'{actor}@example.com'}} for c in range(3)]}
+            elif event_type == 'PullRequestEvent':
+                payload = {'action': rng.choice(['opened', 'closed']), 'number': rng.randrange(1, 5000),
+                           'pull_request': {'title': f'Improve performance of component {n}',
+                                            'html_url': f'https://github.com/{full_name}/pull/{n}',
+                                            'merged': rng.random() < 0.5}}
+            elif event_type == 'IssuesEvent':
+                payload = {'action': 'opened', 'issue': {'title': f'Crash when loading config {n}',
+                                                         'html_url': f'https://github.com/{full_name}/issues/{n}'}}
+            elif event_type == 'ReleaseEvent':
+                payload = {'action': 'published', 'release': {'tag_name': f'v1.{n}.0', 'name': f'Release 1.{n}'}}
+            elif event_type == 'CreateEvent':
+                payload = {'ref': f'feature-{n}', 'ref_type': 'branch'}
+            else:
+                payload = {'action': 'started'}
+            events.append({
+                'id': str(int(hashlib.sha1(f'{full_name}:{n}'.encode()).hexdigest()[:10], 16)),
+                'type': event_type,
+                'actor': {'id': rng.randrange(10 ** 6), 'login': actor, 'url': f'https://api.github.com/users/{actor}'},
+                'repo': {'id': 1, 'name': full_name, 'url': f'https://api.github.com/repos/{full_name}'},
+                'payload': payload,
+                'public': True,
+                'created_at': _iso(created),
+            })
+        return events
+
+    def repo_pulls(self, full_name: str) -> List[Dict[str, Any]]:
+        rng = random.Random(f'{self.seed}:pulls:{full_name}')
+        return [{
+            'number': n,
+            'title': f'Refactor subsystem {n}',
+            'state': rng.choice(['open', 'closed']),
+            'comments': int(rng.expovariate(1 / 4)),
+            'updated_at': _iso(self.now - timedelta(hours=rng.uniform(0, 72))),
+            'html_url': f'https://github.com/{full_name}/pull/{n}',
+            'user': {'login': f'dev{rng.randrange(50)}'},
+        } for n in range(10)]
+
+    def trending_html(self) -> str:
+        articles = []
+        for i in range(25):
+            name = self.repo_name(i * 7)
+            articles.append(f"""
+<article class="Box-row">
+  <h2 class="h3 lh-condensed"><a href="/{name}" data-view-component="true" class="Link">{name}</a></h2>
+  <p class="col-9 color-fg-muted my-1 pr-4">Trending synthetic project number {i}</p>
+  <div class="f6 color-fg-muted mt-2">
+    <span class="d-inline-block ml-0 mr-3"><span itemprop="programmingLanguage">Python</span></span>
+    <a href="/{name}/stargazers" class="Link Link--muted d-inline-block mr-3">{(25 - i) * 1000:,}</a>
+    <span class="d-inline-block float-sm-right">{(25 - i) * 40} stars today</span>
+  </div>
+</article>""")
+        return '<html><body><div class="Box">' + ''.join(articles) + '</div></body></html>'
+
+    # 按路径生成响应体（结果缓存，序列化开销不计入被测代码的耗时）
+    def body_for(self, path: str, query: Dict[str, List[str]]) -> Optional[bytes]:
+        key = (path, tuple(sorted((k, tuple(v)) for k, v in query.items())))
+        with self._lock:
+            cached = self._body_cache.get(key)
+        if cached is not None:
+            return cached
+
+        parts = path.strip('/').split('/')
+        if path == '/user/starred':
+            per_page = int(query.get('per_page', ['30'])[0])
+            page = int(query.get('page', ['1'])[0])
+            body = json.dumps(self.starred_items()[(page - 1) * per_page:page * per_page]).encode('utf-8')
+        elif len(parts) == 4 and parts[0] == 'repos' and parts[3] == 'events':
+            body = json.dumps(self.repo_events(f'{parts[1]}/{parts[2]}')).encode('utf-8')
+        elif len(parts) == 4 and parts[0] == 'repos' and parts[3] == 'pulls':
+            body = json.dumps(self.repo_pulls(f'{parts[1]}/{parts[2]}')).encode('utf-8')
+        elif parts[0] == 'trending':
+            body = self.trending_html().encode('utf-8')
+        else:
+            return None
+        with self._lock:
+            self._body_cache[key] = body
+        return body
+
+    def make_server(self, host: str = '127.0.0.1', port: int = 0) -> ThreadingHTTPServer:
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status, body=b'', content_type='application/json; charset=utf-8', headers=None):
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                if status != 304:
+                    self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                if body:
+                    self.wfile.write(body)
+                fake.count('bytes', len(body))
+
+            def do_GET(self):
+                if fake.latency:
+                    time.sleep(fake.latency)
+                fake.count('requests')
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+                body = fake.body_for(url.path, query)
+                if body is None:
+                    self._send(404, b'{"message": "Not Found"}')
+                    return
+
+                etag = '"%s"' % hashlib.sha1(body).hexdigest()
+                conditional_hit = self.headers.get('If-None-Match') == etag
+                allowed, remaining, reset = fake.take_rate_limit(conditional_hit)
+                headers = {
+                    'ETag': etag,
+                    'X-RateLimit-Limit': str(fake.rate_limit),
+                    'X-RateLimit-Remaining': str(remaining),
+                    'X-RateLimit-Reset': str(int(reset)),
+                    'X-RateLimit-Resource': 'core',
+                }
+                if not allowed:
+                    self._send(403, b'{"message": "API rate limit exceeded"}', headers=headers)
+                    return
+                if conditional_hit:
+                    fake.count('not_modified')
+                    self._send(304, headers=headers)
+                    return
+
+                if url.path == '/user/starred':
+                    per_page = int(query.get('per_page', ['30'])[0])
+                    page = int(query.get('page', ['1'])[0])
+                    if page * per_page < fake.repo_count:
+                        base = f'http://{self.headers.get("Host")}/user/starred'
+                        headers['Link'] = (f'<{base}?per_page={per_page}&sort=created&direction=desc'
+                                           f'&page={page + 1}>; rel="next"')
+                content_type = 'text/html; charset=utf-8' if url.path.startswith('/trending') \
+                    else 'application/json; charset=utf-8'
+                self._send(200, body, content_type, headers)
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                request = json.loads(self.rfile.read(length) or b'{}')
+                if urlparse(self.path).path != '/v1/chat/completions':
+                    self._send(404, b'{"error": {"message": "Not Found"}}')
+                    return
+                fake.count('llm_requests')
+                time.sleep(fake.llm_latency)
+                prompt = ''.join(m.get('content', '') for m in request.get('messages', []))
+                text = (f'今日GitHub动态播报：你关注的仓库有不少更新。本次输入约 {len(prompt)} 个字符。'
+                        '热门项目也很活跃。以上就是今天的播报。')
+                model = request.get('model', 'bench')
+                if request.get('stream'):
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'text/event-stream')
+                    self.send_header('Connection', 'close')
+                    self.end_headers()
+                    for piece in [text[i:i + 8] for i in range(0, len(text), 8)]:
+                        chunk = {'id': 'bench', 'object': 'chat.completion.chunk', 'created': int(time.time()),
+                                 'model': model, 'choices': [{'index': 0, 'delta': {'content': piece},
+                                                              'finish_reason': None}]}
+                        self.wfile.write(f'data: {json.dumps(chunk, ensure_ascii=False)}\n\n'.encode('utf-8'))
+                    self.wfile.write(b'data: [DONE]\n\n')
+                    self.close_connection = True
+                    return
+                body = json.dumps({
+                    'id': 'bench', 'object': 'chat.completion', 'created': int(time.time()), 'model': model,
+                    'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': text},
+                                 'finish_reason': 'stop'}],
+                    'usage': {'prompt_tokens': len(prompt) // 2, 'completion_tokens': len(text) // 2,
+                              'total_tokens': (len(prompt) + len(text)) // 2},
+                }, ensure_ascii=False).encode('utf-8')
+                self._send(200, body)
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        return server
+
+
+# 子进程：在已配置好环境变量的进程中运行被测代码
+def run_worker(mode: str, size: int) -> Dict[str, Any]:
+    import git_radio
+
+    timings = {}
+    counts = {}
+
+    def timed(stage, func, *args, **kwargs):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        timings[stage] = time.perf_counter() - start
+        return result
+
+    def metrics_report():
+        # 被测代码自身记录的阶段汇总和计数器（HTTP请求、缓存命中、304、字节数等）
+        report = git_radio.get_run_metrics().report()
+        return {'stages': report['stages'], 'counters': report['counters'], 'gauges': report['gauges']}
+
+    if mode == 'pipeline':
+        timed('pipeline', git_radio.main, 'auto')
+        return {'timings': timings, 'counts': counts, 'metrics': metrics_report()}
+
+    git_radio.start_run_metrics()
+    repos = timed('starred', git_radio.get_starred_repos)
+    counts['starred'] = len(repos)
+    recent = sorted(repos, key=lambda x: x.get('updated_at', ''), reverse=True)[:size]
+    window_start = datetime.now(timezone.utc) - timedelta(hours=24)
+    store = git_radio.EventStore() if git_radio.EVENT_STORE_ENABLED else None
+    try:
+        events = timed('events', git_radio.fetch_repos_events, recent, since=window_start, store=store)
+        if store:
+            events = store.query_events(window_start, repos=[r['full_name'] for r in recent], per_repo_limit=10)
+    finally:
+        if store:
+            store.close()
+    counts['events'] = len(events)
+    trending = timed('trending', git_radio.get_trending_repos)
+    counts['trending'] = len(trending)
+    summary = timed('summary', git_radio.summarize_with_gpt, events, trending)
+    counts['summary_chars'] = len(summary)
+    return {'timings': timings, 'counts': counts, 'metrics': metrics_report()}
+
+
+# 子进程：加载一个MeloTTS后端并逐句测量合成耗时
+def run_tts_worker(backend: str, rounds: int) -> Dict[str, Any]:
+    import git_radio
+
+    metrics = git_radio.start_run_metrics()
+    engine = git_radio.init_melotts_engine('auto')
+    expected = 'melotts' if backend == 'torch' else 'melotts_onnx'
+    if not engine or engine['type'] != expected:
+        raise RuntimeError(f'{backend} 后端不可用')
+    speaker_id = git_radio._melotts_speaker_id(engine, 'auto')
+    sample_rate = git_radio.melotts_sample_rate(engine)
+    sentences = git_radio.split_sentences(TTS_BENCH_TEXT)
+    # 预热一句（首次推理的内存分配和算子初始化不计入结果）
+    git_radio.synthesize_segment(engine, sentences[0], speaker_id)
+
+    latencies = []
+    audio_seconds = 0.0
+    for _ in range(rounds):
+        for sentence in sentences:
+            start = time.perf_counter()
+            pcm = git_radio.synthesize_segment(engine, sentence, speaker_id)
+            latencies.append(time.perf_counter() - start)
+            audio_seconds += len(pcm) / 2 / sample_rate
+    stages = metrics.stages()
+    latencies.sort()
+    return {
+        'load_seconds': stages.get('tts_load', {}).get('total_seconds', 0.0),
+        'export_seconds': stages.get('onnx_export', {}).get('total_seconds', 0.0),
+        'sentences': len(latencies),
+        'audio_seconds': audio_seconds,
+        'synthesis_seconds': sum(latencies),
+        'rtf': sum(latencies) / audio_seconds if audio_seconds else None,
+        'p50_seconds': latencies[len(latencies) // 2],
+        'max_seconds': latencies[-1],
+    }
+
+
+# 父进程：在子进程中测量一个TTS后端
+def run_tts_child(backend: str, args) -> Dict[str, Any]:
+    env = dict(os.environ)
+    env.update(TTS_BACKENDS[backend])
+    env.update({
+        'TTS_DEVICE': 'cpu',
+        'AUDIO_CACHE_ENABLED': 'false',
+        'MELOTTS_AVAILABLE': 'true',
+        'PYTHONIOENCODING': 'utf-8',
+    })
+    if args.threads:
+        # 两个后端使用相同的算子内线程数
+        env['OMP_NUM_THREADS'] = str(args.threads)
+        env['ONNX_INTRA_OP_THREADS'] = str(args.threads)
+    proc = subprocess.run([sys.executable, os.path.abspath(__file__), '--worker', f'tts:{backend}',
+                           '--rounds', str(args.rounds)],
+                          env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+                          stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, encoding='utf-8')
+    result = None
+    for line in proc.stdout.splitlines():
+        if line.startswith(RESULT_PREFIX):
+            result = json.loads(line[len(RESULT_PREFIX):])
+        elif args.verbose:
+            print(f'    {line}')
+    if proc.returncode != 0 or result is None:
+        raise RuntimeError(f'{backend} 子进程失败（退出码 {proc.returncode}）:\n{proc.stdout[-2000:]}')
+    return result
+
+
+def print_tts_report(rows: List[Dict[str, Any]]) -> None:
+    baseline = next((row['rtf'] for row in rows if row['backend'] == 'torch' and row.get('rtf')), None)
+    print()
+    print(f"{'后端':<10} {'加载(s)':>8} {'音频(s)':>8} {'合成(s)':>8} {'RTF':>7} {'p50(s)':>7} {'最慢(s)':>8} {'加速':>6}")
+    for row in rows:
+        if 'error' in row:
+            print(f"{row['backend']:<10} ❌ {row['error'].strip().splitlines()[-1]}")
+            continue
+        speedup = f"{baseline / row['rtf']:5.2f}x" if baseline and row['rtf'] else f"{'-':>6}"
+        print(f"{row['backend']:<10} {row['load_seconds']:8.2f} {row['audio_seconds']:8.2f} "
+              f"{row['synthesis_seconds']:8.2f} {row['rtf']:7.3f} {row['p50_seconds']:7.3f} "
+              f"{row['max_seconds']:8.3f} {speedup}")
+        if row['export_seconds']:
+            print(f"{'':<10} （首次运行，另含ONNX导出 {row['export_seconds']:.1f}s）")
+
+
+def run_tts_benchmark(args) -> None:
+    backends = [backend.strip() for backend in args.tts_backends.split(',') if backend.strip()]
+    unknown = [backend for backend in backends if backend not in TTS_BACKENDS]
+    if unknown:
+        raise SystemExit(f"未知的TTS后端: {', '.join(unknown)}（可选 {', '.join(TTS_BACKENDS)}）")
+    rows = []
+    for backend in backends:
+        print(f"⏱️  {backend} ...")
+        try:
+            rows.append({'backend': backend, **run_tts_child(backend, args)})
+        except RuntimeError as e:
+            rows.append({'backend': backend, 'error': str(e)})
+    print_tts_report(rows)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'config': {'threads': args.threads, 'rounds': args.rounds, 'cpu_count': os.cpu_count()},
+                       'results': rows}, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 结果已保存到 {args.json}")
+
+
+# 父进程：启动一个子进程运行指定模式并收集结果
+def run_child(mode: str, size: int, cache_dir: str, base_url: str, args) -> Dict[str, Any]:
+    env = dict(os.environ)
+    env.update({
+        'GIT_RADIO_CACHE_DIR': cache_dir,
+        'GITHUB_API_URL': base_url,
+        'GITHUB_WEB_URL': base_url,
+        'GITHUB_TOKEN': 'bench-token',
+        'GITHUB_BACKEND': 'rest',
+        'POLL_REQUEST_BUDGET': str(size * 2),  # REST每个仓库2次请求，保证每个仓库都被轮询
+        'MODEL': 'OPENAI',
+        'MODEL_API_KEY': 'bench-key',
+        'MODEL_BASE_URL': f'{base_url}/v1',
+        'MELOTTS_AVAILABLE': 'false',
+        'PYTTSX3_AVAILABLE': 'false',
+        'PYTHONIOENCODING': 'utf-8',
+    })
+    if args.workers:
+        env['GITHUB_MAX_WORKERS'] = str(args.workers)
+    if not args.event_store:
+        env['EVENT_STORE_ENABLED'] = 'false'
+    proc = subprocess.run([sys.executable, os.path.abspath(__file__), '--worker', mode, '--sizes', str(size)],
+                          env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+                          stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, encoding='utf-8')
+    result = None
+    for line in proc.stdout.splitlines():
+        if line.startswith(RESULT_PREFIX):
+            result = json.loads(line[len(RESULT_PREFIX):])
+        elif args.verbose:
+            print(f'    {line}')
+    if proc.returncode != 0 or result is None:
+        raise RuntimeError(f'{mode} 子进程失败（退出码 {proc.returncode}）:\n{proc.stdout[-2000:]}')
+    return result
+
+
+def print_report(rows: List[Dict[str, Any]]) -> None:
+    print()
+    print(f"{'仓库数':>7} {'模式':<9} {'阶段':<9} {'耗时(s)':>9} {'仓库/s':>9} {'请求数':>7} {'304':>6} {'KB':>9}")
+    for row in rows:
+        for stage, seconds in row['timings'].items():
+            throughput = f"{row['size'] / seconds:9.1f}" if stage in ('starred', 'events', 'pipeline') and seconds else \
+                f"{'-':>9}"
+            print(f"{row['size']:>7} {row['mode']:<9} {stage:<9} {seconds:9.3f} {throughput}")
+        server = row['server']
+        print(f"{'':>7} {'':<9} {'合计':<9} {sum(row['timings'].values()):9.3f} {'':>9} "
+              f"{server['requests']:>7} {server['not_modified']:>6} {server['bytes'] / 1024:9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Git Radio 离线性能基准（本地模拟GitHub API和LLM）')
+    parser.add_argument('--sizes', default='10,100,1000,5000', help='逗号分隔的starred仓库数量')
+    parser.add_argument('--modes', default='cold,warm,pipeline', help='要运行的模式: cold,warm,pipeline')
+    parser.add_argument('--latency', type=float, default=20, help='模拟GitHub每个请求的延迟（毫秒）')
+    parser.add_argument('--llm-latency', type=float, default=500, help='桩LLM的响应延迟（毫秒）')
+    parser.add_argument('--events-per-repo', type=int, default=30, help='每个仓库的模拟事件数')
+    parser.add_argument('--rate-limit', type=int, default=1000000, help='模拟的每小时API额度')
+    parser.add_argument('--workers', type=int, help='覆盖GITHUB_MAX_WORKERS')
+    parser.add_argument('--event-store', action='store_true', help='启用本地事件库（默认关闭以单独测量抓取）')
+    parser.add_argument('--seed', type=int, default=0, help='模拟数据的随机种子')
+    parser.add_argument('--json', metavar='PATH', help='把结果写入JSON文件')
+    parser.add_argument('--verbose', action='store_true', help='显示被测代码的输出')
+    parser.add_argument('--tts', action='store_true', help='改为测量MeloTTS各推理后端的实时率')
+    parser.add_argument('--tts-backends', default='torch,onnx,onnx-int8', help='要测量的TTS后端')
+    parser.add_argument('--threads', type=int, help='TTS推理的算子内线程数（torch与ONNX Runtime相同）')
+    parser.add_argument('--rounds', type=int, default=3, help='TTS基准文本的合成轮数')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+
+    if args.worker and args.worker.startswith('tts:'):
+        result = run_tts_worker(args.worker.split(':', 1)[1], args.rounds)
+        print(RESULT_PREFIX + json.dumps(result))
+        return
+    if args.tts:
+        run_tts_benchmark(args)
+        return
+
+    if args.worker:
+        result = run_worker(args.worker, sizes[0])
+        print(RESULT_PREFIX + json.dumps(result))
+        return
+
+    modes = [mode.strip() for mode in args.modes.split(',') if mode.strip()]
+    fake = FakeGitHub(events_per_repo=args.events_per_repo, latency=args.latency / 1000,
+                      llm_latency=args.llm_latency / 1000, rate_limit=args.rate_limit, seed=args.seed)
+    server = fake.make_server()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f'http://127.0.0.1:{server.server_address[1]}'
+    print(f"🧪 模拟GitHub服务: {base_url}（延迟 {args.latency:g}ms，LLM延迟 {args.llm_latency:g}ms）")
+
+    rows = []
+    try:
+        with tempfile.TemporaryDirectory(prefix='git-radio-bench-') as root:
+            for size in sizes:
+                cold_dir = os.path.join(root, f'{size}-stages')
+                for mode in modes:
+                    cache_dir = os.path.join(root, f'{size}-pipeline') if mode == 'pipeline' else cold_dir
+                    if mode == 'warm' and not os.path.isdir(cold_dir):
+                        # 没有先跑cold时先预热一次缓存（不计入结果）
+                        fake.reset(size)
+                        run_child('stages', size, cold_dir, base_url, args)
+                    fake.reset(size)
+                    print(f"⏱️  {size} 个仓库 / {mode} ...")
+                    result = run_child('stages' if mode != 'pipeline' else 'pipeline', size, cache_dir,
+                                       base_url, args)
+                    rows.append({'size': size, 'mode': mode, 'timings': result['timings'],
+                                 'counts': result['counts'], 'metrics': result['metrics'],
+                                 'server': dict(fake.stats)})
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    print_report(rows)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'config': {k: v for k, v in vars(args).items() if k != 'worker'}, 'results': rows}, f,
+                      ensure_ascii=False, indent=2)
+        print(f"\n💾 结果已保存到 {args.json}")
+
+
+if __name__ == '__main__':
+    main()
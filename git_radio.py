@@ -1,13 +1,31 @@
 import os
 import requests
+from requests.adapters import HTTPAdapter
 from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
 import time
 from bs4 import BeautifulSoup
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple, Iterable, Iterator, NamedTuple, Callable
 import tempfile
+import json
+import sys
+import hashlib
+import sqlite3
 import subprocess
+import shutil
 import platform
+import threading
+import queue
+import re
+import io
+import math
+import wave
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED, Future
+from itertools import repeat
+import multiprocessing
+from contextlib import contextmanager
+from urllib.parse import quote
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 # 加载环境变量
 load_dotenv()
 
@@ -15,62 +33,523 @@ load_dotenv()
 MELOTTS_AVAILABLE = os.getenv('MELOTTS_AVAILABLE', 'true').lower() == 'true'
 PYTTSX3_AVAILABLE = os.getenv('PYTTSX3_AVAILABLE', 'true').lower() == 'true'
 
-# 根据环境变量配置导入相应的TTS库
-if MELOTTS_AVAILABLE:
+# MeloTTS（连带torch）和pyttsx3导入较慢，推迟到初始化语音引擎时再导入
+TTS_DEVICE = os.getenv('TTS_DEVICE', 'auto')  # auto / cpu / cuda:0 / mps
+
+# trending页面优先使用lxml解析，未安装时回退到BeautifulSoup
+try:
+    from lxml import html as lxml_html
+    from lxml import etree
+    LXML_AVAILABLE = True
+except ImportError:
+    LXML_AVAILABLE = False
+
+GITHUB_TOKEN = os.getenv('GITHUB_TOKEN')
+MODEL_API_KEY = os.getenv('MODEL_API_KEY')
+MODEL = os.getenv('MODEL')
+MODEL_BASE_URL = os.getenv('MODEL_BASE_URL')  # 覆盖模型服务地址（OpenAI兼容接口）
+
+# GitHub地址（可指向GitHub Enterprise或本地的模拟服务）
+GITHUB_API_URL = os.getenv('GITHUB_API_URL', 'https://api.github.com').rstrip('/')
+GITHUB_WEB_URL = os.getenv('GITHUB_WEB_URL', 'https://github.com').rstrip('/')
+
+# TTS流水线配置
+TTS_PREFETCH_SEGMENTS = int(os.getenv('TTS_PREFETCH_SEGMENTS', '2'))  # 播放时最多提前合成的句子数
+TTS_MAX_SEGMENT_CHARS = int(os.getenv('TTS_MAX_SEGMENT_CHARS', '80'))  # 单段最大字符数
+AUDIO_CACHE_ENABLED = os.getenv('AUDIO_CACHE_ENABLED', 'true').lower() == 'true'  # 合成音频缓存
+AUDIO_CACHE_MAX_MB = float(os.getenv('AUDIO_CACHE_MAX_MB', '200'))  # 音频缓存大小上限（MB）
+TTS_EXPORT_WORKERS = int(os.getenv('TTS_EXPORT_WORKERS', str(max(1, (os.cpu_count() or 2) // 2))))  # 导出音频的合成进程数
+TTS_BACKEND = os.getenv('TTS_BACKEND', 'torch').lower()  # MeloTTS推理后端: torch / onnx（ONNX Runtime，仅CPU）
+ONNX_QUANTIZE = os.getenv('ONNX_QUANTIZE', 'true').lower() == 'true'  # 使用int8动态量化的ONNX模型
+ONNX_INTRA_OP_THREADS = int(os.getenv('ONNX_INTRA_OP_THREADS', '0'))  # ONNX Runtime算子内线程数，0为默认（物理核数）
+MELOTTS_ENGINE_TYPES = ('melotts', 'melotts_onnx')  # 逐句合成PCM的MeloTTS引擎类型
+_SENTENCE_END_RE = re.compile(r'(?<=[。！？；!?;\n])|(?<=\.)(?=\s)')
+
+# 并发抓取配置
+MAX_REPOS = int(os.getenv('MAX_REPOS', '10'))  # 未设置POLL_REQUEST_BUDGET时，预算按每次检查MAX_REPOS个仓库折算
+GITHUB_MAX_WORKERS = int(os.getenv('GITHUB_MAX_WORKERS', '8'))  # 并发抓取线程数
+RATE_LIMIT_LOW_WATER = int(os.getenv('RATE_LIMIT_LOW_WATER', '100'))  # 剩余额度低于该值时开始均匀节流
+
+# 自适应轮询配置
+POLL_REQUEST_BUDGET = int(os.getenv('POLL_REQUEST_BUDGET', str(MAX_REPOS * 2)))  # 每次运行抓取仓库动态的请求预算
+POLL_MIN_INTERVAL_MINUTES = float(os.getenv('POLL_MIN_INTERVAL_MINUTES', '30'))  # 最活跃仓库的最短轮询间隔
+POLL_MAX_INTERVAL_HOURS = float(os.getenv('POLL_MAX_INTERVAL_HOURS', '168'))  # 沉寂仓库的最长轮询间隔
+POLL_HISTORY_DAYS = float(os.getenv('POLL_HISTORY_DAYS', '30'))  # 统计历史事件频率的天数
+
+# 本地缓存配置
+CACHE_DIR = os.getenv('GIT_RADIO_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'git-radio'))
+HTTP_CACHE_ENABLED = os.getenv('HTTP_CACHE_ENABLED', 'true').lower() == 'true'  # ETag条件请求缓存
+HTTP_CACHE_MAX_MB = float(os.getenv('HTTP_CACHE_MAX_MB', '100'))  # 条件请求缓存大小上限（MB）
+STARRED_FULL_SYNC_HOURS = float(os.getenv('STARRED_FULL_SYNC_HOURS', '168'))  # starred列表全量同步间隔
+EVENT_STORE_ENABLED = os.getenv('EVENT_STORE_ENABLED', 'true').lower() == 'true'  # 本地SQLite事件库
+EVENT_STORE_PATH = os.getenv('EVENT_STORE_PATH', os.path.join(CACHE_DIR, 'events.db'))
+ONNX_MODEL_DIR = os.getenv('ONNX_MODEL_DIR', os.path.join(CACHE_DIR, 'onnx'))  # 导出的MeloTTS ONNX模型
+
+# 仓库动态抓取后端: rest（每仓库两次REST请求）或 graphql（多个仓库合并为一次GraphQL查询）
+GITHUB_BACKEND = os.getenv('GITHUB_BACKEND', 'rest').lower()
+GRAPHQL_BATCH_SIZE = int(os.getenv('GRAPHQL_BATCH_SIZE', '25'))  # 每次GraphQL查询包含的仓库数
+GITHUB_GRAPHQL_URL = f'{GITHUB_API_URL}/graphql'
+
+# HTTP连接与重试配置
+GITHUB_TIMEOUT = float(os.getenv('GITHUB_TIMEOUT', '15'))  # 单次请求超时（秒）
+GITHUB_MAX_RETRIES = int(os.getenv('GITHUB_MAX_RETRIES', '3'))  # 5xx/二级速率限制最大重试次数
+GITHUB_RETRY_BACKOFF = float(os.getenv('GITHUB_RETRY_BACKOFF', '1.0'))  # 指数退避基数（秒）
+
+# trending缓存配置
+TRENDING_CACHE_TTL = float(os.getenv('TRENDING_CACHE_TTL', '3600'))  # trending结果缓存时间（秒）
+TRENDING_LANGUAGES = [lang.strip() for lang in os.getenv('TRENDING_LANGUAGES', '').split(',') if lang.strip()]
+_trending_cache = {}
+_trending_cache_lock = threading.Lock()
+
+# 预编译的trending页面XPath（对应CSS选择器 article.Box-row、h2.h3 a 等）
+if LXML_AVAILABLE:
+    def _has_class(name):
+        return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+    _TRENDING_XPATH = {
+        'articles': etree.XPath(f"//article[{_has_class('Box-row')}]"),
+        'title': etree.XPath(f".//h2[{_has_class('h3')}]//a/@href"),
+        'description': etree.XPath(f".//p[{_has_class('col-9')}]"),
+        'stars_today': etree.XPath(f".//span[{_has_class('d-inline-block')} and {_has_class('float-sm-right')}]"),
+        'total_stars': etree.XPath(".//a[contains(@href, '/stargazers')]"),
+        'language': etree.XPath(".//span[@itemprop='programmingLanguage']"),
+    }
+
+# 进程内共享的音频缓存
+_audio_cache = None
+_audio_cache_lock = threading.Lock()
+
+# 条件请求缓存自上次淘汰以来写入的字节数（None表示本进程尚未淘汰过，首次写入时先淘汰一次）
+_http_cache_written = None
+_http_cache_lock = threading.Lock()
+
+# LLM流式输出：模型每生成一句就送入TTS播报
+LLM_STREAM = os.getenv('LLM_STREAM', 'false').lower() == 'true'
+
+# LLM摘要缓存配置
+SUMMARY_CACHE_ENABLED = os.getenv('SUMMARY_CACHE_ENABLED', 'true').lower() == 'true'
+SUMMARY_CACHE_TTL = float(os.getenv('SUMMARY_CACHE_TTL', '21600'))  # 摘要缓存有效期（秒）
+SUMMARY_CACHE_MAX_ENTRIES = int(os.getenv('SUMMARY_CACHE_MAX_ENTRIES', '200'))
+PROMPT_TOKEN_BUDGET = int(os.getenv('PROMPT_TOKEN_BUDGET', '1000'))  # 摘要提示词的token预算（估算值）
+_summary_cache_lock = threading.Lock()
+
+# 进程内共享的LLM客户端
+_llm_client = None
+_llm_client_lock = threading.Lock()
+
+# 进程内共享的GitHub客户端
+_github_client = None
+_github_client_lock = threading.Lock()
+
+# 运行指标导出配置（路径为空表示不导出）
+METRICS_REPORT_PATH = os.getenv('METRICS_REPORT_PATH', os.path.join(CACHE_DIR, 'run_report.json'))  # JSON运行报告
+METRICS_PROM_PATH = os.getenv('METRICS_PROM_PATH', '')  # Prometheus textfile collector文件（*.prom）
+
+
+# 单次运行的计时和计数指标
+class RunMetrics:
+    """
+    记录一次播报运行的结构化指标（多线程安全）：
+    - 计时span：starred抓取、单仓库抓取、trending、LLM摘要、TTS初始化、合成、播放等阶段的耗时
+    - 计数器：HTTP请求数、缓存命中、304、下载字节数等，可带标签
+    - 仪表值：如各资源剩余的速率限制额度
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at = datetime.now(timezone.utc)
+        self._t0 = time.perf_counter()
+        self.spans = []
+        self.counters = {}
+        self.gauges = {}
+
+    # 计时一个阶段，异常时记录异常类型后继续抛出
+    @contextmanager
+    def span(self, name: str, **attrs):
+        start = time.perf_counter()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            record = {'name': name, 'start': round(start - self._t0, 6),
+                      'duration': round(time.perf_counter() - start, 6), 'thread': threading.current_thread().name}
+            if attrs:
+                record['attrs'] = attrs
+            if error:
+                record['error'] = error
+            with self._lock:
+                self.spans.append(record)
+
+    def incr(self, name: str, value: float = 1, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels) -> None:
+        with self._lock:
+            self.gauges[(name, tuple(sorted(labels.items())))] = value
+
+    # 按阶段汇总span：次数、累计耗时、最长耗时和墙钟跨度（并发阶段的累计耗时会大于墙钟跨度）
+    def stages(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            spans = list(self.spans)
+        stages = {}
+        for span in spans:
+            end = span['start'] + span['duration']
+            stage = stages.setdefault(span['name'], {'count': 0, 'total_seconds': 0.0, 'max_seconds': 0.0,
+                                                     'first_start': span['start'], 'last_end': end})
+            stage['count'] += 1
+            stage['total_seconds'] += span['duration']
+            stage['max_seconds'] = max(stage['max_seconds'], span['duration'])
+            stage['first_start'] = min(stage['first_start'], span['start'])
+            stage['last_end'] = max(stage['last_end'], end)
+        for stage in stages.values():
+            stage['wall_seconds'] = stage.pop('last_end') - stage['first_start']
+            for key in ('total_seconds', 'wall_seconds', 'first_start'):
+                stage[key] = round(stage[key], 6)
+        return stages
+
+    def report(self) -> Dict[str, Any]:
+        """JSON运行报告：阶段汇总、计数器、仪表值和最慢的10个span"""
+        with self._lock:
+            spans = list(self.spans)
+            counters = dict(self.counters)
+            gauges = dict(self.gauges)
+
+        def flatten(values):
+            return [{'name': name, 'labels': dict(labels), 'value': value}
+                    for (name, labels), value in sorted(values.items())]
+
+        return {
+            'started_at': self.started_at.isoformat(),
+            'duration_seconds': round(time.perf_counter() - self._t0, 6),
+            'stages': self.stages(),
+            'counters': flatten(counters),
+            'gauges': flatten(gauges),
+            'slowest_spans': sorted(spans, key=lambda span: span['duration'], reverse=True)[:10],
+        }
+
+    def write_json(self, path: str) -> None:
+        _atomic_write_text(path, json.dumps(self.report(), ensure_ascii=False, indent=2))
+
+    def write_prometheus(self, path: str) -> None:
+        """写出node_exporter textfile collector格式的文件（均为最近一次运行的取值，类型为gauge）"""
+        def labels_of(labels):
+            if not labels:
+                return ''
+            def escape(value):
+                return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+            return '{' + ','.join(f'{k}="{escape(v)}"' for k, v in labels) + '}'
+
+        lines = []
+
+        def metric(name, help_text, samples):
+            lines.append(f'# HELP git_radio_{name} {help_text}')
+            lines.append(f'# TYPE git_radio_{name} gauge')
+            for labels, value in samples:
+                lines.append(f'git_radio_{name}{labels_of(labels)} {value}')
+
+        report = self.report()
+        stages = report['stages']
+        metric('last_run_timestamp_seconds', 'Unix time the last run started',
+               [((), round(self.started_at.timestamp(), 3))])
+        metric('run_duration_seconds', 'Duration of the last run', [((), report['duration_seconds'])])
+        metric('stage_seconds', 'Summed span duration per stage',
+               [((('stage', name),), round(stage['total_seconds'], 6)) for name, stage in stages.items()])
+        metric('stage_wall_seconds', 'Wall-clock time from first span start to last span end per stage',
+               [((('stage', name),), round(stage['wall_seconds'], 6)) for name, stage in stages.items()])
+        metric('stage_spans', 'Number of spans per stage',
+               [((('stage', name),), stage['count']) for name, stage in stages.items()])
+        grouped = {}
+        for item in report['counters'] + report['gauges']:
+            grouped.setdefault(item['name'], []).append((tuple(sorted(item['labels'].items())), item['value']))
+        for name, samples in grouped.items():
+            metric(name, f'{name} in the last run', samples)
+        _atomic_write_text(path, '\n'.join(lines) + '\n')
+
+
+# 原子写入文本文件（先写临时文件再替换，读取方不会看到半截内容）
+def _atomic_write_text(path: str, text: str) -> None:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+_run_metrics = RunMetrics()
+
+
+# 当前运行的指标
+def get_run_metrics() -> RunMetrics:
+    return _run_metrics
+
+
+# 开始记录新的一次运行
+def start_run_metrics() -> RunMetrics:
+    global _run_metrics
+    _run_metrics = RunMetrics()
+    return _run_metrics
+
+
+# 导出当前运行的指标
+def export_run_metrics() -> None:
+    """按METRICS_REPORT_PATH / METRICS_PROM_PATH写出JSON报告和Prometheus文件，写入失败只打印警告"""
+    metrics = get_run_metrics()
+    try:
+        if METRICS_REPORT_PATH:
+            metrics.write_json(METRICS_REPORT_PATH)
+            print(f"📊 运行报告已保存到 {METRICS_REPORT_PATH}")
+        if METRICS_PROM_PATH:
+            metrics.write_prometheus(METRICS_PROM_PATH)
+    except OSError as e:
+        print(f"⚠️ 写入运行指标失败: {e}")
+
+
+# 自动选择推理设备
+def detect_torch_device() -> str:
+    """优先使用TTS_DEVICE环境变量，否则按 cuda > mps > cpu 自动检测"""
+    if TTS_DEVICE != 'auto':
+        return TTS_DEVICE
+    try:
+        import torch
+    except ImportError:
+        return 'cpu'
+    if torch.cuda.is_available():
+        return 'cuda:0'
+    mps = getattr(torch.backends, 'mps', None)
+    if mps is not None and mps.is_available():
+        return 'mps'
+    return 'cpu'
+
+
+# ONNX Runtime版MeloTTS
+class OnnxMeloTTS:
+    """
+    用ONNX Runtime在CPU上运行导出的MeloTTS声学模型（SynthesizerTrn，可选int8动态量化）：
+    文本前端（分句、音素、BERT特征）仍由MeloTTS完成，对外提供与melo.api.TTS相同的 hps / tts_to_file 接口
+    """
+
+    def __init__(self, language: str, model_path: str, threads: Optional[int] = None):
+        import onnxruntime as ort
+        from melo.download_utils import load_or_download_config
+        self.hps = load_or_download_config(language)
+        self.symbol_to_id = {symbol: i for i, symbol in enumerate(self.hps.symbols)}
+        # 与melo.api.TTS一致：中文模型的文本前端按中英混合处理
+        self.language = 'ZH_MIX_EN' if language == 'ZH' else language
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        threads = ONNX_INTRA_OP_THREADS if threads is None else threads
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(model_path, options, providers=['CPUExecutionProvider'])
+
+    def tts_to_file(self, text: str, speaker_id, output_path=None, speed=1.0, sdp_ratio=0.2, noise_scale=0.6,
+                    noise_scale_w=0.8, quiet=False):
+        """合成text；output_path为None时返回float32音频数组，否则写入wav文件"""
+        import numpy as np
+        import torch
+        from melo import utils
+        from melo.api import TTS
+
+        audio_list = []
+        for piece in TTS.split_sentences_into_pieces(text, self.language, quiet):
+            if self.language in ('EN', 'ZH_MIX_EN'):
+                piece = re.sub(r'([a-z])([A-Z])', r'\1 \2', piece)
+            with torch.no_grad():
+                bert, ja_bert, phones, tones, lang_ids = utils.get_text_for_tts_infer(
+                    piece, self.language, self.hps, 'cpu', self.symbol_to_id)
+            inputs = {
+                'x': phones.numpy()[None].astype(np.int64),
+                'x_lengths': np.array([phones.shape[0]], dtype=np.int64),
+                'sid': np.array([speaker_id], dtype=np.int64),
+                'tone': tones.numpy()[None].astype(np.int64),
+                'language': lang_ids.numpy()[None].astype(np.int64),
+                'bert': bert.numpy()[None].astype(np.float32),
+                'ja_bert': ja_bert.numpy()[None].astype(np.float32),
+                'noise_scale': np.array(noise_scale, dtype=np.float32),
+                'length_scale': np.array(1.0 / speed, dtype=np.float32),
+                'noise_scale_w': np.array(noise_scale_w, dtype=np.float32),
+                'sdp_ratio': np.array(sdp_ratio, dtype=np.float32),
+            }
+            audio_list.append(self.session.run(None, inputs)[0][0, 0])
+        audio = TTS.audio_numpy_concat(audio_list, sr=self.hps.data.sampling_rate, speed=speed)
+        if output_path is None:
+            return audio
+        with open(output_path, 'wb') as f:
+            f.write(pcm_to_wav_bytes(PcmEncoder().encode(audio), self.hps.data.sampling_rate))
+
+
+# ONNX模型文件路径
+def onnx_model_path(language: str, quantized: bool = ONNX_QUANTIZE) -> str:
+    return os.path.join(ONNX_MODEL_DIR, f"melotts-{language}{'.int8' if quantized else ''}.onnx")
+
+
+# 把PyTorch版MeloTTS导出为ONNX
+def export_melotts_onnx(language: str, quantize: bool = ONNX_QUANTIZE) -> str:
+    """
+    导出SynthesizerTrn.infer（音素长度为动态维度），quantize时再对权重做int8动态量化；
+    只需在首次使用时执行一次，返回模型路径
+    """
+    import torch
+    from melo import utils
+    from melo.api import TTS
+
+    tts = TTS(language=language, device='cpu')
+    net = tts.model.eval()
+
+    class InferWrapper(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.net = net
+
+        def forward(self, x, x_lengths, sid, tone, lang, bert, ja_bert, noise_scale, length_scale, noise_scale_w,
+                    sdp_ratio):
+            return self.net.infer(x, x_lengths, sid, tone, lang, bert, ja_bert, sdp_ratio=sdp_ratio,
+                                  noise_scale=noise_scale, noise_scale_w=noise_scale_w,
+                                  length_scale=length_scale)[0]
+
+    sample = 'GitHub今天有新版本发布。' if language == 'ZH' else 'GitHub has a new release today.'
+    with torch.no_grad():
+        bert, ja_bert, phones, tones, lang_ids = utils.get_text_for_tts_infer(
+            sample, tts.language, tts.hps, 'cpu', tts.symbol_to_id)
+    args = (phones[None], torch.LongTensor([phones.shape[0]]), torch.LongTensor([0]), tones[None], lang_ids[None],
+            bert[None], ja_bert[None], torch.tensor(0.6), torch.tensor(1.0), torch.tensor(0.8), torch.tensor(0.2))
+    names = ['x', 'x_lengths', 'sid', 'tone', 'language', 'bert', 'ja_bert', 'noise_scale', 'length_scale',
+             'noise_scale_w', 'sdp_ratio']
+    dynamic_axes = {'x': {1: 'phonemes'}, 'tone': {1: 'phonemes'}, 'language': {1: 'phonemes'},
+                    'bert': {2: 'phonemes'}, 'ja_bert': {2: 'phonemes'}, 'audio': {2: 'samples'}}
+
+    os.makedirs(ONNX_MODEL_DIR, exist_ok=True)
+    fp32_path = onnx_model_path(language, quantized=False)
+    tmp_path = f"{fp32_path}.{os.getpid()}.tmp"
+    with torch.no_grad():
+        torch.onnx.export(InferWrapper(), args, tmp_path, input_names=names, output_names=['audio'],
+                          dynamic_axes=dynamic_axes, opset_version=17)
+    os.replace(tmp_path, fp32_path)
+    if not quantize:
+        return fp32_path
+
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+    path = onnx_model_path(language, quantized=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    quantize_dynamic(fp32_path, tmp_path, weight_type=QuantType.QInt8)
+    os.replace(tmp_path, path)
+    return path
+
+
+# 初始化ONNX Runtime版MeloTTS引擎
+def init_onnx_melotts_engine(language='auto') -> Optional[Dict[str, Any]]:
+    """加载ONNX模型（不存在时先从PyTorch模型导出），失败时返回None以回退到PyTorch推理"""
+    try:
+        import onnxruntime  # noqa: F401
+    except ImportError:
+        print("⚠️ onnxruntime未安装，使用PyTorch推理")
+        return None
+
+    model_language = 'ZH' if language.lower() in ('zh', 'auto') else 'EN'
+    try:
+        path = onnx_model_path(model_language)
+        if not os.path.exists(path):
+            print(f"📦 首次使用，导出MeloTTS ONNX模型到 {path} ...")
+            with get_run_metrics().span('onnx_export', language=model_language, quantized=ONNX_QUANTIZE):
+                export_melotts_onnx(model_language)
+        with get_run_metrics().span('tts_load', language=model_language, device='onnx'):
+            model = OnnxMeloTTS(model_language, path)
+        print(f"🎤 使用MeloTTS{'中文' if model_language == 'ZH' else '英文'}语音"
+              f"（ONNX Runtime{'，int8量化' if ONNX_QUANTIZE else ''}）")
+        return {'type': 'melotts_onnx', 'model': model, 'speaker_ids': model.hps.data.spk2id,
+                'language': model_language, 'quantized': ONNX_QUANTIZE}
+    except Exception as e:
+        print(f"⚠️ ONNX模型加载失败: {e}，使用PyTorch推理")
+        return None
+
+
+# 初始化MeloTTS引擎
+def init_melotts_engine(language='auto') -> Optional[Dict[str, Any]]:
+    """
+    加载MeloTTS模型，失败时返回None
+    :param language: 'zh' for Chinese, 'en' for English, 'auto' for auto-detect
+    """
+    if not MELOTTS_AVAILABLE:
+        return None
     try:
         from melo.api import TTS
-        print("✅ MeloTTS已启用")
     except ImportError:
         print("⚠️ MeloTTS未安装，但环境变量已启用，将回退到其他TTS")
-        MELOTTS_AVAILABLE = False
+        return None
+
+    if TTS_BACKEND == 'onnx':
+        engine = init_onnx_melotts_engine(language)
+        if engine:
+            return engine
 
-if PYTTSX3_AVAILABLE:
     try:
-        import pyttsx3
-        print("✅ pyttsx3已启用")
-    except ImportError:
-        print("⚠️ pyttsx3未安装，但环境变量已启用")
-        PYTTSX3_AVAILABLE = False
-GITHUB_TOKEN = os.getenv('GITHUB_TOKEN')
-MODEL_API_KEY = os.getenv('MODEL_API_KEY')
-MODEL = os.getenv('MODEL')
+        device = detect_torch_device()
+        print(f"🖥️ MeloTTS推理设备: {device}")
+        
+        # 根据语言选择模型
+        if language.lower() in ('zh', 'auto'):
+            try:
+                with get_run_metrics().span('tts_load', language='ZH', device=device):
+                    model = TTS(language='ZH', device=device)
+                speaker_ids = model.hps.data.spk2id
+                print("🎤 使用MeloTTS中文语音")
+                return {'type': 'melotts', 'model': model, 'speaker_ids': speaker_ids, 'language': 'ZH'}        
+            except Exception as e:
+                print(f"⚠️ 中文模型加载失败: {e}，尝试英文模型")
+        
+        # 默认使用英文模型
+        with get_run_metrics().span('tts_load', language='EN', device=device):
+            model = TTS(language='EN', device=device)
+        speaker_ids = model.hps.data.spk2id
+        print("🎤 使用MeloTTS英文语音 (美式)")
+        return {'type': 'melotts', 'model': model, 'speaker_ids': speaker_ids, 'language': 'EN'}
+        
+    except Exception as e:
+        print(f"⚠️ MeloTTS初始化失败: {e}，回退到系统TTS")
+        return None
+
+
+# 在后台线程预加载MeloTTS
+def start_tts_warmup(language='auto') -> Future:
+    """
+    在后台线程加载MeloTTS模型，与GitHub数据抓取并行进行；
+    返回的Future结果交给init_tts_engine(warmup=...)使用
+    """
+    future = Future()
+
+    def run():
+        try:
+            future.set_result(init_melotts_engine(language))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, name='tts-warmup', daemon=True).start()
+    return future
 
 
 # 初始化语音引擎
-def init_tts_engine(language='auto'):
+def init_tts_engine(language='auto', warmup: Optional[Future] = None):
     """
     初始化语音引擎 (优先使用MeloTTS，备用pyttsx3)
     :param language: 'zh' for Chinese, 'en' for English, 'auto' for auto-detect
+    :param warmup: start_tts_warmup返回的Future，提供时等待其结果而不是重新加载MeloTTS
     """
     
-    # 优先尝试MeloTTS
-    if MELOTTS_AVAILABLE:
-        try:
-            # Speed is adjustable
-            device = 'mps' # or cuda:0 or mps or cpu
-            
-            # 根据语言选择模型
-            if language == 'zh' or language == 'auto':
-                try:
-                    model = TTS(language='ZH', device=device)
-                    speaker_ids = model.hps.data.spk2id
-                    print("🎤 使用MeloTTS中文语音")
-                    return {'type': 'melotts', 'model': model, 'speaker_ids': speaker_ids, 'language': 'ZH'}        
-                except Exception as e:
-                    print(f"⚠️ 中文模型加载失败: {e}，尝试英文模型")
-            
-            # 默认使用英文模型
-            model = TTS(language='EN', device=device)
-            speaker_ids = model.hps.data.spk2id
-            print("🎤 使用MeloTTS英文语音 (美式)")
-            return {'type': 'melotts', 'model': model, 'speaker_id': speaker_id, 'language': 'EN'}
-            
-        except Exception as e:
-            print(f"⚠️ MeloTTS初始化失败: {e}，回退到系统TTS")
+    # 优先尝试MeloTTS（span只包含主线程实际等待的时间，后台加载耗时见tts_load）
+    with get_run_metrics().span('tts_init'):
+        engine = warmup.result() if warmup is not None else init_melotts_engine(language)
+    if engine:
+        return engine
     
     # 备用方案：使用pyttsx3
     if PYTTSX3_AVAILABLE:
         try:
+            import pyttsx3
             engine = pyttsx3.init()
             engine.setProperty('rate', 150)  # 语速150%
             engine.setProperty('volume', 0.9)  # 音量90%
@@ -79,7 +558,7 @@ def init_tts_engine(language='auto'):
             voices = engine.getProperty('voices')
             selected_voice = None
             
-            if language == 'zh' or language == 'auto':
+            if language.lower() in ('zh', 'auto'):
                 # 寻找中文语音
                 for voice in voices:
                     if 'zh' in voice.id.lower() or 'chinese' in voice.name.lower() or 'ting' in voice.name.lower():
@@ -87,7 +566,7 @@ def init_tts_engine(language='auto'):
                         print(f"🎤 使用pyttsx3中文语音: {voice.name}")
                         break
             
-            if not selected_voice and (language == 'en' or language == 'auto'):
+            if not selected_voice and language.lower() in ('en', 'auto'):
                 # 寻找英语语音
                 for voice in voices:
                     if ('en' in voice.id.lower() or 'english' in voice.name.lower() or 
@@ -109,6 +588,8 @@ def init_tts_engine(language='auto'):
             engine.setProperty('voice', selected_voice.id)
             return {'type': 'pyttsx3', 'engine': engine}
             
+        except ImportError:
+            print("⚠️ pyttsx3未安装，但环境变量已启用")
         except Exception as e:
             print(f"⚠️ pyttsx3初始化失败: {e}")
     
@@ -121,6 +602,448 @@ def init_tts_engine(language='auto'):
     raise Exception("❌ 无可用的语音引擎")
 
 
+# 按句子切分播报文本
+def split_sentences(text: str, min_chars: int = 6, max_chars: int = TTS_MAX_SEGMENT_CHARS) -> List[str]:
+    """
+    在中英文句末标点（。！？；!?; 以及后跟空白的英文句点）和换行处切分文本
+    过短的片段并入前一句，过长的句子再按逗号切开，保证每段合成耗时相近
+    """
+    segments = []
+    for piece in _SENTENCE_END_RE.split(text):
+        piece = piece.strip()
+        if not piece:
+            continue
+        # 过长的句子按逗号再切分
+        while len(piece) > max_chars:
+            cut = max(piece.rfind(mark, 0, max_chars) for mark in '，,、：:')
+            cut = cut + 1 if cut > 0 else max_chars
+            segments.append(piece[:cut].strip())
+            piece = piece[cut:].strip()
+        if segments and len(piece) < min_chars:
+            joiner = ' ' if piece[0].isascii() and segments[-1][-1].isascii() else ''
+            segments[-1] += joiner + piece
+        elif piece:
+            segments.append(piece)
+    return segments
+
+
+# 选择MeloTTS的speaker_id
+def _melotts_speaker_id(tts_engine, language):
+    """根据语言选择speaker_id，如果是auto则使用引擎的默认语言，找不到则使用第一个可用的"""
+    speaker_ids = tts_engine['speaker_ids']
+    actual_language = tts_engine.get('language', 'ZH') if language == 'auto' else language
+    if actual_language in speaker_ids:
+        return speaker_ids[actual_language]
+    print(f"⚠️ 未找到语言 {actual_language} 的speaker，使用默认speaker")
+    return list(speaker_ids.values())[0]
+
+
+# 播放音频文件
+def play_audio_file(path: str) -> None:
+    """使用系统播放器同步播放wav文件"""
+    system = platform.system()
+    if system == "Darwin":  # macOS
+        subprocess.run(["afplay", path], check=True)
+    elif system == "Linux":
+        subprocess.run(["aplay", "-q", path], check=True)
+    elif system == "Windows":
+        import winsound
+        winsound.PlaySound(path, winsound.SND_FILENAME)
+
+
+# 把PCM数据封装为wav字节
+def pcm_to_wav_bytes(pcm: bytes, sample_rate: int, channels: int = 1) -> bytes:
+    output = io.BytesIO()
+    with wave.open(output, 'wb') as writer:
+        writer.setnchannels(channels)
+        writer.setsampwidth(2)
+        writer.setframerate(sample_rate)
+        writer.writeframes(pcm)
+    return output.getvalue()
+
+
+# 浮点音频转16位PCM
+class PcmEncoder:
+    """把模型输出的float音频转换为16位PCM，缩放和裁剪复用同一块缓冲区，避免每句重新分配"""
+
+    def __init__(self):
+        self._scratch = None
+
+    def encode(self, audio) -> bytes:
+        import numpy as np
+        audio = np.asarray(audio, dtype=np.float32).reshape(-1)
+        if self._scratch is None or self._scratch.shape[0] < audio.shape[0]:
+            self._scratch = np.empty(max(audio.shape[0], 1 << 16), dtype=np.float32)
+        scratch = self._scratch[:audio.shape[0]]
+        np.multiply(audio, 32767.0, out=scratch)
+        np.clip(scratch, -32768.0, 32767.0, out=scratch)
+        return scratch.astype('<i2').tobytes()
+
+
+# 内存音频播放器
+class AudioSink:
+    """
+    把16位单声道PCM直接送入播放器，不经过临时文件：
+    - Linux: 常驻的 aplay 进程，从stdin读取原始PCM
+    - 已安装sounddevice时: 进程内音频输出流
+    - Windows: winsound从内存播放
+    - 其他情况（如未安装sounddevice的macOS）: 回退到临时文件 + afplay
+    """
+
+    def __init__(self, sample_rate: int):
+        self.sample_rate = sample_rate
+        self._proc = None
+        self._stream = None
+        system = platform.system()
+        if system == "Linux" and shutil.which('aplay'):
+            self._proc = subprocess.Popen(
+                ['aplay', '-q', '-t', 'raw', '-f', 'S16_LE', '-c', '1', '-r', str(sample_rate), '-'],
+                stdin=subprocess.PIPE)
+        elif system != "Windows":
+            try:
+                import sounddevice
+                self._stream = sounddevice.RawOutputStream(samplerate=sample_rate, channels=1, dtype='int16')
+                self._stream.start()
+            except ImportError:
+                pass
+
+    def write(self, pcm: bytes) -> None:
+        """播放一段PCM（写入管道即返回，由播放器按实际速度消费）"""
+        if self._proc is not None:
+            self._proc.stdin.write(pcm)
+            self._proc.stdin.flush()
+        elif self._stream is not None:
+            self._stream.write(pcm)
+        elif platform.system() == "Windows":
+            import winsound
+            winsound.PlaySound(pcm_to_wav_bytes(pcm, self.sample_rate), winsound.SND_MEMORY)
+        else:
+            with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as temp_file:
+                temp_file.write(pcm_to_wav_bytes(pcm, self.sample_rate))
+            try:
+                play_audio_file(temp_file.name)
+            finally:
+                os.unlink(temp_file.name)
+
+    def close(self) -> None:
+        """等待播放结束"""
+        if self._proc is not None:
+            self._proc.stdin.close()
+            if self._proc.wait() != 0:
+                raise RuntimeError(f"aplay退出码 {self._proc.returncode}")
+        elif self._stream is not None:
+            self._stream.stop()
+            self._stream.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+            return
+        # 出错时立即停止播放；被kill的aplay退出码非0，关闭时的错误不能掩盖原始异常
+        if self._proc is not None:
+            self._proc.kill()
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+# 按LRU淘汰缓存目录中超出大小上限的文件
+def evict_lru_files(directory: str, suffix: str, max_bytes: float) -> None:
+    """按最近使用时间（文件mtime，命中时刷新）从旧到新删除以suffix结尾的文件，直到总大小不超过max_bytes"""
+    entries = []
+    try:
+        scanned = list(os.scandir(directory))
+    except OSError:
+        return
+    for entry in scanned:
+        if entry.name.endswith(suffix):
+            # 其他进程可能已在扫描后删除该条目
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.unlink(path)
+            total -= size
+        except OSError:
+            pass
+
+
+# 合成音频的本地缓存
+class AudioCache:
+    """
+    按内容寻址的合成音频缓存：键为(文本片段, 语言, speaker_id, 语速, 引擎)的哈希，
+    总大小超过上限时按最近使用时间（文件mtime）淘汰最久未使用的条目
+    """
+
+    def __init__(self, directory: str = os.path.join(CACHE_DIR, 'audio'),
+                 max_bytes: int = int(AUDIO_CACHE_MAX_MB * 1024 * 1024)):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    # 计算缓存键对应的文件路径
+    def path_for(self, text: str, language: str, speaker_id, speed: float, engine: str) -> str:
+        key = json.dumps([text, language, str(speaker_id), round(float(speed), 3), engine], ensure_ascii=False)
+        return os.path.join(self.directory, hashlib.sha256(key.encode('utf-8')).hexdigest() + '.wav')
+
+    # 查询缓存，命中时刷新最近使用时间并返回PCM数据
+    def get(self, path: str) -> Optional[bytes]:
+        try:
+            with wave.open(path, 'rb') as reader:
+                pcm = reader.readframes(reader.getnframes())
+            os.utime(path)
+            return pcm
+        except (OSError, EOFError, wave.Error):
+            return None
+
+    # 把合成好的PCM写入缓存
+    def put(self, path: str, pcm: bytes, sample_rate: int) -> None:
+        # 导出工作进程共享缓存目录，临时文件名同时包含进程号和线程号
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(pcm_to_wav_bytes(pcm, sample_rate))
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"⚠️ 写入音频缓存失败: {e}")
+            return
+        self.evict()
+
+    # 按LRU淘汰超出大小上限的条目
+    def evict(self) -> None:
+        with self._lock:
+            evict_lru_files(self.directory, '.wav', self.max_bytes)
+
+
+# 获取共享的音频缓存（未启用时返回None）
+def get_audio_cache() -> Optional[AudioCache]:
+    global _audio_cache
+    if not AUDIO_CACHE_ENABLED:
+        return None
+    with _audio_cache_lock:
+        if _audio_cache is None:
+            _audio_cache = AudioCache()
+        return _audio_cache
+
+
+# MeloTTS输出采样率
+def melotts_sample_rate(tts_engine) -> int:
+    return tts_engine['model'].hps.data.sampling_rate
+
+
+# 用MeloTTS合成一句话
+def synthesize_segment(tts_engine, sentence: str, speaker_id, speed=1.0,
+                       encoder: Optional[PcmEncoder] = None) -> bytes:
+    """
+    在内存中合成一句话，返回16位单声道PCM；启用音频缓存时优先命中缓存
+    :param encoder: 复用的PCM编码器，连续合成多句时传入以复用缓冲区
+    """
+    language = tts_engine.get('language', 'ZH')
+    cache = get_audio_cache()
+    # 量化模型的输出与原模型不同，按引擎类型和是否量化分别缓存
+    engine_tag = tts_engine['type'] + ('_int8' if tts_engine.get('quantized') else '')
+    cache_path = cache.path_for(sentence, language, speaker_id, speed, engine_tag) if cache else None
+    if cache_path:
+        pcm = cache.get(cache_path)
+        if pcm is not None:
+            get_run_metrics().incr('cache_hits', cache='audio')
+            return pcm
+    # output_path为None时MeloTTS直接返回音频数组
+    with get_run_metrics().span('synthesis', chars=len(sentence)):
+        audio = tts_engine['model'].tts_to_file(sentence, speaker_id, None, speed=speed, quiet=True)
+        pcm = (encoder or PcmEncoder()).encode(audio)
+    if cache_path:
+        cache.put(cache_path, pcm, melotts_sample_rate(tts_engine))
+    return pcm
+
+
+# 把整段文本渲染为一个wav
+def render_wav_bytes(tts_engine, text: str, language='auto', speed=1.0) -> bytes:
+    """逐句合成（复用音频缓存）后按顺序拼接为一个wav文件的字节内容，仅支持MeloTTS"""
+    if tts_engine.get('type') not in MELOTTS_ENGINE_TYPES:
+        raise ValueError(f"引擎 {tts_engine.get('type')} 不支持渲染音频文件")
+    speaker_id = _melotts_speaker_id(tts_engine, language)
+    encoder = PcmEncoder()
+    pcm = b''.join(synthesize_segment(tts_engine, sentence, speaker_id, speed, encoder)
+                   for sentence in split_sentences(text))
+    return pcm_to_wav_bytes(pcm, melotts_sample_rate(tts_engine))
+
+
+# 导出格式对应的ffmpeg编码参数（wav无需编码）
+AUDIO_EXPORT_CODECS = {
+    'wav': None,
+    'opus': ['-c:a', 'libopus', '-b:a', '32k'],
+    'mp3': ['-c:a', 'libmp3lame', '-q:a', '5'],
+}
+
+
+# 检查导出路径的音频格式
+def check_audio_export(path: str) -> str:
+    """按扩展名返回音频格式；格式不支持或缺少ffmpeg时在合成前就报错"""
+    audio_format = os.path.splitext(path)[1].lstrip('.').lower() or 'wav'
+    if audio_format not in AUDIO_EXPORT_CODECS:
+        raise ValueError(f"不支持的音频格式: {audio_format}（支持 {'/'.join(AUDIO_EXPORT_CODECS)}）")
+    if AUDIO_EXPORT_CODECS[audio_format] and not shutil.which('ffmpeg'):
+        raise RuntimeError(f"导出{audio_format}需要安装ffmpeg")
+    return audio_format
+
+
+# 把PCM写为音频文件
+def write_audio_file(path: str, pcm: bytes, sample_rate: int) -> None:
+    """按扩展名选择格式：wav直接写入；opus/mp3通过ffmpeg编码"""
+    audio_format = check_audio_export(path)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    if audio_format == 'wav':
+        with open(path, 'wb') as f:
+            f.write(pcm_to_wav_bytes(pcm, sample_rate))
+        return
+    subprocess.run([shutil.which('ffmpeg'), '-y', '-loglevel', 'error', '-f', 's16le', '-ar', str(sample_rate),
+                    '-ac', '1', '-i', '-', *AUDIO_EXPORT_CODECS[audio_format], path], input=pcm, check=True)
+
+
+# 导出工作进程内的MeloTTS引擎（按语言懒加载，每个进程只加载一次）
+_export_tts_engines = {}
+
+
+def _export_worker_init(threads: int) -> None:
+    # 多个进程并行推理时限制每个进程的线程数，避免CPU超额订阅
+    global ONNX_INTRA_OP_THREADS
+    if not ONNX_INTRA_OP_THREADS:
+        ONNX_INTRA_OP_THREADS = threads
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+
+def _export_worker_synthesize(sentence: str, language: str, speed: float) -> Tuple[int, bytes]:
+    engine = _export_tts_engines.get(language)
+    if engine is None:
+        engine = init_melotts_engine(language)
+        if engine is None:
+            raise RuntimeError("导出工作进程中MeloTTS不可用")
+        _export_tts_engines[language] = engine
+    pcm = synthesize_segment(engine, sentence, _melotts_speaker_id(engine, language), speed)
+    return melotts_sample_rate(engine), pcm
+
+
+# 把一批播报文本渲染为音频文件
+def export_broadcasts(jobs: List[Tuple[str, str, str]], speed=1.0, workers: int = TTS_EXPORT_WORKERS,
+                      tts_engine=None) -> List[str]:
+    """
+    多进程导出播报音频（播客）：所有文本切分后的句子分发到MeloTTS进程池，
+    每个工作进程只加载一次模型，结果按原顺序拼接后写为wav/opus/mp3
+    :param jobs: (文本, 输出路径, 语言) 列表，输出格式由扩展名决定
+    :param workers: 合成进程数，不大于1时在当前进程中顺序合成
+    :param tts_engine: 顺序合成时复用的已加载MeloTTS引擎，只用于与其语言相同（或auto）的任务，
+                       其他语言的模型按需加载，每种语言只加载一次
+    :return: 写出的文件路径
+    """
+    segments = [(index, sentence, language) for index, (text, _, language) in enumerate(jobs)
+                for sentence in split_sentences(text)]
+    workers = min(workers, len(segments))
+    with get_run_metrics().span('export', jobs=len(jobs), segments=len(segments), workers=max(workers, 1)):
+        if workers > 1:
+            print(f"🏭 使用 {workers} 个进程合成 {len(segments)} 段音频...")
+            # spawn启动的进程不继承父进程的torch线程池状态，fork在已加载torch时可能死锁
+            context = multiprocessing.get_context('spawn')
+            threads = max(1, (os.cpu_count() or workers) // workers)
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_export_worker_init,
+                                     initargs=(threads,)) as pool:
+                results = list(pool.map(_export_worker_synthesize, [sentence for _, sentence, _ in segments],
+                                        [language for _, _, language in segments], repeat(speed)))
+        else:
+            # 与工作进程相同，按语言缓存模型：批量播报中不同用户的语言可能不同
+            engines = {}
+            if tts_engine and tts_engine.get('type') in MELOTTS_ENGINE_TYPES:
+                engines[tts_engine['language']] = tts_engine
+            default_language = tts_engine['language'] if engines else 'ZH'
+
+            def engine_for(language):
+                model_language = default_language if language.lower() == 'auto' else \
+                    'ZH' if language.lower() == 'zh' else 'EN'
+                if model_language not in engines:
+                    engine = init_melotts_engine(language)
+                    if not engine or engine.get('type') not in MELOTTS_ENGINE_TYPES:
+                        raise RuntimeError("导出音频需要MeloTTS")
+                    engines[model_language] = engine
+                return engines[model_language]
+
+            encoder = PcmEncoder()
+            results = []
+            for _, sentence, language in segments:
+                engine = engine_for(language)
+                results.append((melotts_sample_rate(engine),
+                                synthesize_segment(engine, sentence, _melotts_speaker_id(engine, language), speed,
+                                                   encoder)))
+
+        pieces = {}
+        for (index, _, _), (sample_rate, pcm) in zip(segments, results):
+            pieces.setdefault(index, (sample_rate, []))[1].append(pcm)
+        written = []
+        for index, (_, path, _) in enumerate(jobs):
+            if index in pieces:
+                sample_rate, pcms = pieces[index]
+                write_audio_file(path, b''.join(pcms), sample_rate)
+                written.append(path)
+        return written
+
+
+# 边合成边播放的MeloTTS流水线
+def stream_melotts(tts_engine, sentences: Iterable[str], speaker_id, speed=1.0) -> None:
+    """
+    生产者线程逐句合成，主线程按顺序把PCM写入播放器：第N句播放时第N+1句已在合成，
+    首句音频的等待时间只取决于第一句的合成耗时；
+    启用音频缓存时，已合成过的句子直接从缓存播放
+    """
+    segments = queue.Queue(maxsize=TTS_PREFETCH_SEGMENTS)
+    stop = threading.Event()
+
+    def producer():
+        encoder = PcmEncoder()
+        try:
+            for sentence in sentences:
+                if stop.is_set():
+                    return
+                segments.put(synthesize_segment(tts_engine, sentence, speaker_id, speed, encoder))
+        except Exception as e:
+            segments.put(e)
+        finally:
+            segments.put(None)
+
+    thread = threading.Thread(target=producer, name='tts-producer', daemon=True)
+    thread.start()
+    try:
+        with AudioSink(melotts_sample_rate(tts_engine)) as sink:
+            while True:
+                item = segments.get()
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                sink.write(item)
+    finally:
+        # 播放出错时通知生产者停止，并取走队列中剩余的数据让生产者退出
+        stop.set()
+        while thread.is_alive():
+            try:
+                segments.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+
 # 通用TTS语音播报函数
 def speak_with_tts(tts_engine, text, language='auto', speed=1.0):
     """
@@ -133,195 +1056,1163 @@ def speak_with_tts(tts_engine, text, language='auto', speed=1.0):
     try:
         engine_type = tts_engine.get('type', 'melotts')
         
-        if engine_type == 'melotts':
-            # 使用MeloTTS
-            model = tts_engine['model']
-            speaker_ids = tts_engine['speaker_ids']
-            
-            # 处理语言参数，如果是auto则使用引擎的默认语言
-            if language == 'auto':
-                actual_language = tts_engine.get('language', 'ZH')
-            else:
-                actual_language = language
-            
-            # 获取speaker_id，如果找不到则使用第一个可用的
-            if actual_language in speaker_ids:
-                speaker_id = speaker_ids[actual_language]
+        # MeloTTS的播放span包含与播放重叠进行的逐句合成
+        with get_run_metrics().span('playback', engine=engine_type):
+            if engine_type in MELOTTS_ENGINE_TYPES:
+                # 使用MeloTTS，按句子流水线合成与播放
+                speaker_id = _melotts_speaker_id(tts_engine, language)
+                stream_melotts(tts_engine, split_sentences(text), speaker_id, speed=speed)
+
+            elif engine_type == 'pyttsx3':
+                # 使用pyttsx3
+                engine = tts_engine['engine']
+                engine.say(text)
+                engine.runAndWait()
+
+            elif engine_type == 'system_say':
+                # 使用系统say命令 (macOS)
+                subprocess.run(["say", text], check=True)
+
             else:
-                # 使用第一个可用的speaker
-                speaker_id = list(speaker_ids.values())[0]
-                print(f"⚠️ 未找到语言 {actual_language} 的speaker，使用默认speaker")
-            
-            # 创建临时文件
-            with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as temp_file:
-                temp_path = temp_file.name
-            
-            # 生成语音文件
-            model.tts_to_file(text, speaker_id, temp_path, speed=speed)
-            
-            # 播放音频文件
-            system = platform.system()
-            if system == "Darwin":  # macOS
-                subprocess.run(["afplay", temp_path], check=True)
-            elif system == "Linux":
-                subprocess.run(["aplay", temp_path], check=True)
-            elif system == "Windows":
-                import winsound
-                winsound.PlaySound(temp_path, winsound.SND_FILENAME)
-            
-            # 清理临时文件
-            os.unlink(temp_path)
-            
+                print(f"⚠️ 未知的TTS引擎类型: {engine_type}")
+        
+    except Exception as e:
+        print(f"❌ TTS语音播报失败: {e}")
+        raise e
+
+
+# 逐句播报
+def speak_sentences(tts_engine, sentences: Iterable[str], language='auto', speed=1.0):
+    """
+    播报一个句子序列（可以是仍在生成中的生成器）
+    MeloTTS在后台线程边消费边合成，pyttsx3/say按到达顺序逐句朗读
+    """
+    engine_type = tts_engine.get('type', 'melotts')
+    with get_run_metrics().span('playback', engine=engine_type):
+        if engine_type in MELOTTS_ENGINE_TYPES:
+            stream_melotts(tts_engine, sentences, _melotts_speaker_id(tts_engine, language), speed=speed)
         elif engine_type == 'pyttsx3':
-            # 使用pyttsx3
             engine = tts_engine['engine']
-            engine.say(text)
-            engine.runAndWait()
-            
+            for sentence in sentences:
+                engine.say(sentence)
+                engine.runAndWait()
         elif engine_type == 'system_say':
-            # 使用系统say命令 (macOS)
-            subprocess.run(["say", text], check=True)
-            
+            for sentence in sentences:
+                subprocess.run(["say", sentence], check=True)
         else:
             print(f"⚠️ 未知的TTS引擎类型: {engine_type}")
-        
-    except Exception as e:
-        print(f"❌ TTS语音播报失败: {e}")
-        raise e
 
 
-# 获取starred仓库列表
-def get_starred_repos() -> List[Dict[str, Any]]:
-    """获取用户starred的仓库列表"""
-    headers = {
-        'Authorization': f'token {GITHUB_TOKEN}',
-        'Accept': 'application/vnd.github.v3+json',
-        'User-Agent': 'Git-Radio/1.0'
-    }
+# 条件请求缓存文件路径（按URL哈希）
+def _http_cache_path(url: str) -> str:
+    return os.path.join(CACHE_DIR, 'http', hashlib.sha256(url.encode('utf-8')).hexdigest() + '.json')
+
+
+# 读取某个URL的条件请求缓存
+def load_http_cache(url: str) -> Optional[Dict[str, Any]]:
+    """读取URL对应的缓存条目（etag、last_modified、data），不存在或损坏时返回None；命中时刷新最近使用时间"""
+    path = _http_cache_path(url)
     try:
-        response = requests.get('https://api.github.com/user/starred?per_page=50', headers=headers)
+        with open(path, 'r', encoding='utf-8') as f:
+            entry = json.load(f)
+        os.utime(path)
+        return entry
+    except (OSError, ValueError):
+        return None
+
+
+# 写入某个URL的条件请求缓存
+def save_http_cache(url: str, etag: Optional[str], last_modified: Optional[str], data: Any,
+                    link: Optional[str] = None) -> None:
+    """
+    以原子替换方式写入缓存文件，多线程并发写同一URL时不会产生半截文件；
+    每写入约十分之一的HTTP_CACHE_MAX_MB就按LRU淘汰一次，缓存目录总大小保持在上限以内
+    """
+    global _http_cache_written
+    path = _http_cache_path(url)
+    body = json.dumps({'url': url, 'etag': etag, 'last_modified': last_modified, 'link': link, 'data': data},
+                      ensure_ascii=False).encode('utf-8')
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(body)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"⚠️ 写入HTTP缓存失败: {e}")
+        return
+
+    max_bytes = HTTP_CACHE_MAX_MB * 1024 * 1024
+    with _http_cache_lock:
+        if _http_cache_written is not None and _http_cache_written + len(body) < max_bytes / 10:
+            _http_cache_written += len(body)
+            return
+        _http_cache_written = 0
+    evict_lru_files(os.path.dirname(path), '.json', max_bytes)
+
+
+# GitHub API客户端
+class GitHubClient:
+    """
+    共享的GitHub API客户端：
+    - 复用连接池的requests.Session（keep-alive，避免每次请求重新TCP+TLS握手）
+    - 统一的请求头、速率限制节流和重试/指数退避策略
+    - REST GET请求带ETag条件请求缓存
+    """
+
+    def __init__(self, token: Optional[str] = None, pool_size: int = GITHUB_MAX_WORKERS,
+                 max_retries: int = GITHUB_MAX_RETRIES, backoff: float = GITHUB_RETRY_BACKOFF):
+        self.token = token
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.headers = {
+            'Accept': 'application/vnd.github.v3+json',
+            'User-Agent': 'Git-Radio/1.0'
+        }
+        if token:
+            self.headers['Authorization'] = f'token {token}'
+        # 区分不同用户的本地状态（/user/* 接口缓存、starred同步游标），不直接使用token
+        self.user_key = hashlib.sha256(token.encode('utf-8')).hexdigest()[:16] if token else 'anonymous'
+
+        self.session = requests.Session()
+        # 连接池大小与并发线程数一致，重试由request()统一处理
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(1, pool_size), max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        # 速率限制状态（按X-RateLimit-Resource区分core/graphql，由响应头更新，多线程共享）
+        self._rate_limit_lock = threading.Lock()
+        self._rate_limit = {}
+        # 节流时下一个请求允许发出的时间（按resource区分），每个调用方占用一个时间槽
+        self._next_allowed_at = {}
+
+    # 根据响应头更新速率限制状态
+    def update_rate_limit(self, response: requests.Response) -> None:
+        """读取 X-RateLimit-Remaining / X-RateLimit-Reset 响应头并记录"""
+        remaining = response.headers.get('X-RateLimit-Remaining')
+        reset = response.headers.get('X-RateLimit-Reset')
+        if remaining is None or reset is None:
+            return
+        resource = response.headers.get('X-RateLimit-Resource', 'core')
+        with self._rate_limit_lock:
+            self._rate_limit[resource] = {'remaining': int(remaining), 'reset': int(reset)}
+        get_run_metrics().set_gauge('rate_limit_remaining', int(remaining), resource=resource)
+
+    # 请求前按剩余额度节流
+    def wait_for_rate_limit(self, resource: str = 'core') -> None:
+        """
+        根据最近一次响应头决定是否等待：
+        额度充足时不等待；低于RATE_LIMIT_LOW_WATER时把剩余额度均匀分布到重置前，
+        所有线程共享同一个节拍（next_allowed_at），每个调用方等到分配给自己的时间槽；
+        额度耗尽时等待到重置时间
+        :param resource: 速率限制分类（core/graphql）
+        """
+        with self._rate_limit_lock:
+            state = self._rate_limit.get(resource)
+            if state is None:
+                return
+            remaining = state['remaining']
+            now = time.time()
+            window = state['reset'] - now
+            if window <= 0:
+                # 已过重置时间，等待下一次响应头刷新
+                del self._rate_limit[resource]
+                self._next_allowed_at.pop(resource, None)
+                return
+            # 先占用一个额度，避免并发线程同时认为还有余量
+            state['remaining'] = max(remaining - 1, 0)
+            if remaining >= RATE_LIMIT_LOW_WATER:
+                return
+            slot = max(now, self._next_allowed_at.get(resource, 0))
+            if remaining <= 0:
+                slot = max(slot, state['reset'] + 1)
+                self._next_allowed_at[resource] = slot
+            else:
+                # 间隔按本次时间槽到重置时间的剩余时长计算，分配出的时间槽都落在重置之前
+                self._next_allowed_at[resource] = slot + max(0.0, state['reset'] - slot) / remaining
+
+        if remaining <= 0:
+            print(f"⏳ GitHub API额度已用完，等待 {int(slot - now) + 1} 秒后重置")
+        time.sleep(max(0.0, slot - now))
+
+    # 判断响应是否应当重试，返回建议等待秒数（None表示不重试）
+    def _retry_delay(self, response: requests.Response, attempt: int) -> Optional[float]:
+        delay = self.backoff * (2 ** attempt)
+        retry_after = response.headers.get('Retry-After')
+        if response.status_code >= 500:
+            return delay
+        if response.status_code in (403, 429):
+            # 二级速率限制（secondary rate limit）会带Retry-After或在正文中说明
+            if retry_after is not None:
+                return max(float(retry_after), delay)
+            if 'secondary rate limit' in response.text.lower():
+                return max(60.0, delay)
+        return None
+
+    # 统一的带重试请求
+    def request(self, method: str, url: str, headers: Optional[Dict[str, str]] = None,
+                **kwargs) -> requests.Response:
+        """
+        发送请求，对连接错误、5xx和二级速率限制按指数退避重试
+        :param headers: 本次请求的请求头（不会自动附带GitHub认证头）
+        """
+        for attempt in range(self.max_retries + 1):
+            metrics = get_run_metrics()
+            try:
+                response = self.session.request(method, url, headers=headers, timeout=GITHUB_TIMEOUT, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                metrics.incr('http_errors')
+                if attempt >= self.max_retries:
+                    raise
+                delay = self.backoff * (2 ** attempt)
+                print(f"⚠️ 请求 {url} 出错: {e}，{delay:.1f} 秒后重试")
+                time.sleep(delay)
+                continue
+
+            metrics.incr('http_requests', method=method)
+            metrics.incr('http_bytes_downloaded', len(response.content))
+            if response.status_code == 304:
+                metrics.incr('http_not_modified')
+            delay = self._retry_delay(response, attempt)
+            if delay is None or attempt >= self.max_retries:
+                return response
+            metrics.incr('http_retries')
+            print(f"⚠️ 请求 {url} 返回 {response.status_code}，{delay:.1f} 秒后重试")
+            time.sleep(delay)
+        return response
+
+    # 带条件请求缓存的GitHub REST GET请求
+    def get_json(self, url: str, headers: Optional[Dict[str, str]] = None) -> Tuple[int, Any, requests.Response]:
+        """
+        发送GitHub REST GET请求，自动附带认证头和If-None-Match/If-Modified-Since；
+        304响应直接使用本地缓存的数据（不计入GitHub速率限制）
+        :param headers: 额外的请求头，会覆盖默认请求头
+        :return: (状态码, 解析后的JSON数据, 原始响应)；304命中缓存时状态码视为200
+        """
+        request_headers = dict(self.headers)
+        if headers:
+            request_headers.update(headers)
+        # /user/* 接口的内容因用户而异，缓存键附加用户标识
+        cache_key = f'{url}#{self.user_key}' if url.startswith(f'{GITHUB_API_URL}/user/') else url
+        cached = load_http_cache(cache_key) if HTTP_CACHE_ENABLED else None
+        if cached:
+            if cached.get('etag'):
+                request_headers['If-None-Match'] = cached['etag']
+            if cached.get('last_modified'):
+                request_headers['If-Modified-Since'] = cached['last_modified']
+
+        self.wait_for_rate_limit()
+        response = self.request('GET', url, headers=request_headers)
+        self.update_rate_limit(response)
         response.encoding = 'utf-8'  # 确保正确的编码
-        
+
+        if response.status_code == 304 and cached:
+            get_run_metrics().incr('cache_hits', cache='http')
+            # 304响应不一定带Link头，补上缓存的分页链接以便继续翻页
+            if cached.get('link') and 'Link' not in response.headers:
+                response.headers['Link'] = cached['link']
+            return 200, cached['data'], response
         if response.status_code == 200:
-            return response.json()
-        elif response.status_code == 401:
-            print("❌ GitHub Token无效或已过期，请检查.env文件中的GITHUB_TOKEN")
-            return []
-        else:
-            print(f"获取starred仓库失败: {response.status_code} - {response.text}")
-            return []
+            data = response.json()
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+            if HTTP_CACHE_ENABLED and (etag or last_modified):
+                save_http_cache(cache_key, etag, last_modified, data, response.headers.get('Link'))
+            return 200, data, response
+        return response.status_code, None, response
+
+    # GitHub GraphQL查询
+    def graphql(self, query: str, variables: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        发送GraphQL查询，返回data字段；整体失败时抛出RuntimeError，
+        部分错误（如某个仓库不存在）只打印警告，对应字段为None
+        """
+        self.wait_for_rate_limit('graphql')
+        response = self.request('POST', GITHUB_GRAPHQL_URL, headers=self.headers,
+                                json={'query': query, 'variables': variables or {}})
+        self.update_rate_limit(response)
+        if response.status_code != 200:
+            raise RuntimeError(f"GraphQL请求失败: {response.status_code} - {response.text[:200]}")
+        body = response.json()
+        if body.get('errors'):
+            if not body.get('data'):
+                raise RuntimeError(f"GraphQL查询出错: {body['errors'][0].get('message')}")
+            print(f"⚠️ GraphQL部分查询出错: {body['errors'][0].get('message')}")
+        return body.get('data') or {}
+
+
+# 获取默认的GitHub客户端（进程内共享）
+def get_github_client() -> GitHubClient:
+    """懒加载使用GITHUB_TOKEN的共享客户端，所有线程复用同一个连接池"""
+    global _github_client
+    with _github_client_lock:
+        if _github_client is None:
+            _github_client = GitHubClient(GITHUB_TOKEN)
+        return _github_client
+
+
+# 逐页获取starred仓库（生成器）
+# starred仓库只保留用到的字段（GitHub返回的仓库对象约100个字段，同步状态文件会随star数线性膨胀）
+STARRED_REPO_FIELDS = ('full_name', 'starred_at', 'pushed_at', 'updated_at', 'stargazers_count', 'private')
+
+
+def _slim_starred_repo(repo: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: repo[key] for key in STARRED_REPO_FIELDS if key in repo}
+
+
+def iter_starred_repos(since: Optional[str] = None, per_page: int = 100, client: Optional[GitHubClient] = None,
+                       seen: Optional[Dict[str, Dict[str, Any]]] = None):
+    """
+    按star时间倒序逐页获取starred仓库，沿Link头翻页，每页到达即逐个yield（只保留STARRED_REPO_FIELDS）
+    :param since: 同步游标（上次同步时最新的starred_at），遇到不晚于该时间的star即停止
+    :param per_page: 每页数量（GitHub上限100）
+    :param client: GitHub客户端，默认使用共享客户端
+    :param seen: 提供时收集最后一页中游标之前（已同步过）的仓库信息，供刷新pushed_at等易变字段
+    """
+    client = client or get_github_client()
+    headers = {'Accept': 'application/vnd.github.star+json'}  # 返回带starred_at的条目
+    url = f'{GITHUB_API_URL}/user/starred?per_page={per_page}&sort=created&direction=desc'
+    while url:
+        status, data, response = client.get_json(url, headers)
+        if status == 401:
+            raise PermissionError("GitHub Token无效或已过期，请检查.env文件中的GITHUB_TOKEN")
+        if status != 200:
+            raise RuntimeError(f"获取starred仓库失败: {status} - {response.text}")
+
+        reached_cursor = False
+        for item in data:
+            if since and item['starred_at'] <= since:
+                reached_cursor = True
+                if seen is None:
+                    return
+                seen[item['repo']['full_name']] = _slim_starred_repo(item['repo'])
+                continue
+            repo = _slim_starred_repo(item['repo'])
+            repo['starred_at'] = item['starred_at']
+            yield repo
+        if reached_cursor:
+            return
+
+        url = response.links.get('next', {}).get('url')
+
+
+# starred同步状态文件路径（每个用户一份）
+def _starred_sync_path(user_key: str) -> str:
+    return os.path.join(CACHE_DIR, f'starred_sync-{user_key}.json')
+
+
+# 读取starred同步状态
+def load_starred_sync_state(user_key: str) -> Optional[Dict[str, Any]]:
+    """读取上次同步保存的游标和仓库列表"""
+    try:
+        with open(_starred_sync_path(user_key), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+# 保存starred同步状态
+def save_starred_sync_state(user_key: str, state: Dict[str, Any]) -> None:
+    """保存同步游标和仓库列表"""
+    path = _starred_sync_path(user_key)
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(path + '.tmp', path)
+    except OSError as e:
+        print(f"⚠️ 保存starred同步状态失败: {e}")
+
+
+# 用最新读取的仓库信息刷新已同步仓库的易变字段
+def _refresh_starred_repo(repo: Dict[str, Any], latest: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    # 旧版本保存的完整仓库对象在这里一并精简
+    repo = _slim_starred_repo(repo)
+    if not latest:
+        return repo
+    for key in ('pushed_at', 'updated_at', 'stargazers_count'):
+        if key in latest:
+            repo[key] = latest[key]
+    return repo
+
+
+# 获取starred仓库列表
+def get_starred_repos(client: Optional[GitHubClient] = None) -> List[Dict[str, Any]]:
+    """
+    获取用户starred的完整仓库列表
+    有同步游标时只拉取上次同步之后新增的star；超过STARRED_FULL_SYNC_HOURS后做一次全量同步以识别取消的star
+    """
+    client = client or get_github_client()
+    state = load_starred_sync_state(client.user_key)
+    now = time.time()
+    incremental = bool(state and state.get('cursor')
+                       and now - state.get('full_synced_at', 0) < STARRED_FULL_SYNC_HOURS * 3600)
+
+    try:
+        with get_run_metrics().span('starred_fetch', incremental=incremental):
+            if incremental:
+                # 读取新star时顺带拿到的已同步仓库（至少第一页）用于刷新pushed_at，调度器据此判断近期推送
+                seen = {}
+                new_repos = list(iter_starred_repos(since=state['cursor'], client=client, seen=seen))
+                new_names = {repo['full_name'] for repo in new_repos}
+                repos = new_repos + [_refresh_starred_repo(repo, seen.get(repo['full_name']))
+                                     for repo in state['repos'] if repo['full_name'] not in new_names]
+                full_synced_at = state['full_synced_at']
+                if new_repos:
+                    print(f"🔄 增量同步: 新增 {len(new_repos)} 个starred仓库")
+            else:
+                repos = list(iter_starred_repos(client=client))
+                full_synced_at = now
+    except PermissionError as e:
+        print(f"❌ {e}")
+        return []
     except Exception as e:
         print(f"获取starred仓库出错: {e}")
-        return []
+        # 网络异常时退回到上次同步的结果
+        return state['repos'] if state else []
+
+    cursor = repos[0]['starred_at'] if repos else None
+    save_starred_sync_state(client.user_key, {'cursor': cursor, 'full_synced_at': full_synced_at, 'repos': repos})
+    return repos
+
+
+# 精简的事件模型
+class RepoEvent(NamedTuple):
+    """
+    播报用的仓库事件：解析时只投影出用到的字段，不保留原始JSON、提交列表和嵌套的repo/actor对象。
+    基于tuple（无实例__dict__），每个事件的内存占用小且固定；类型和仓库名等重复字符串做驻留共享
+    """
+    id: str  # GitHub事件id，合成事件（HotPullRequest、GraphQL事件）为空
+    type: str
+    repo: str
+    actor: str
+    created_at: str  # UTC 'YYYY-MM-DDTHH:MM:SSZ'
+    action: str = ''  # opened/closed/published，CreateEvent为ref_type，HotPullRequest为PR状态
+    title: str = ''  # PR/Issue标题、Release名称或最新提交的标题行
+    url: str = ''
+    tag: str = ''  # Release的tag，CreateEvent的ref
+    commits: int = 0  # PushEvent的提交数
+    comments: int = 0  # HotPullRequest的评论数
+
+    @classmethod
+    def create(cls, event_type: str, repo: str, actor: str, created_at: str, event_id: str = '',
+               payload: Optional[Dict[str, Any]] = None) -> 'RepoEvent':
+        """
+        从事件类型和payload投影出事件：payload可以是GitHub REST原始payload，
+        也可以是 RepoEvent.payload() 的精简格式（事件库中存储的格式）
+        """
+        payload = payload or {}
+        pr = payload.get('pull_request') or {}
+        issue = payload.get('issue') or {}
+        release = payload.get('release') or {}
+        commits = payload.get('commits') or 0
+        headline = ''
+        if isinstance(commits, list):
+            headline = commits[-1].get('message', '').split('\n', 1)[0] if commits else ''
+            commits = payload.get('size') or len(commits)
+        return cls(
+            id=str(event_id or ''),
+            type=sys.intern(event_type),
+            repo=sys.intern(repo),
+            actor=sys.intern(actor or 'ghost'),
+            created_at=created_at,
+            action=payload.get('action') or payload.get('ref_type') or payload.get('state') or '',
+            title=(pr.get('title') or issue.get('title') or release.get('name') or payload.get('title')
+                   or payload.get('name') or headline or '')[:200],
+            url=pr.get('html_url') or issue.get('html_url') or release.get('html_url') or payload.get('url') or '',
+            tag=release.get('tag_name') or payload.get('tag_name') or payload.get('tag')
+            or (payload.get('ref') if event_type == 'CreateEvent' else '') or '',
+            commits=int(commits or payload.get('size') or 0),
+            comments=int(payload.get('comments') or 0),
+        )
+
+    @classmethod
+    def from_github(cls, raw: Dict[str, Any]) -> 'RepoEvent':
+        """从 /repos/{owner}/{repo}/events 返回的原始事件投影"""
+        return cls.create(raw['type'], raw['repo']['name'], (raw.get('actor') or {}).get('login'),
+                          raw['created_at'], raw.get('id'), raw.get('payload'))
+
+    def payload(self) -> Dict[str, Any]:
+        """事件库中存储的精简payload（只保留非空字段）"""
+        fields = {'action': self.action, 'title': self.title, 'url': self.url, 'tag': self.tag,
+                  'commits': self.commits, 'comments': self.comments}
+        return {key: value for key, value in fields.items() if value}
+
+
+# 需要播报的GitHub事件类型
+IMPORTANT_EVENT_TYPES = frozenset(['PushEvent', 'PullRequestEvent', 'IssuesEvent', 'ReleaseEvent', 'CreateEvent'])
+
+
+# 本地事件库
+class EventStore:
+    """
+    基于SQLite的本地事件库：
+    - 按GitHub事件id去重（HotPullRequest等合成事件使用派生id，重复写入时更新为最新内容）
+    - 记录每个仓库已入库事件的高水位，后续只抓取更新的事件
+    - 播报时可按任意时间窗口查询，无需再次访问网络
+    - 记录每个仓库的上次轮询时间，供自适应轮询计算到期时间和事件频率
+    """
+
+    def __init__(self, path: str = EVENT_STORE_PATH):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS events (
+                id TEXT PRIMARY KEY,
+                repo TEXT NOT NULL,
+                type TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                actor TEXT,
+                payload TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_events_repo ON events (repo, created_at);
+            CREATE INDEX IF NOT EXISTS idx_events_type ON events (type);
+            CREATE INDEX IF NOT EXISTS idx_events_created_at ON events (created_at);
+            CREATE TABLE IF NOT EXISTS repo_state (
+                repo TEXT PRIMARY KEY,
+                high_water TEXT
+            );
+            CREATE TABLE IF NOT EXISTS broadcasts (
+                at TEXT PRIMARY KEY
+            );
+            CREATE TABLE IF NOT EXISTS repo_polls (
+                repo TEXT PRIMARY KEY,
+                last_polled TEXT NOT NULL
+            );
+        """)
+
+    # 事件唯一id：GitHub事件自带id，合成事件按类型+仓库+关键字段派生
+    @staticmethod
+    def event_id(event: RepoEvent) -> str:
+        if event.id:
+            return event.id
+        # GraphQL合成的PushEvent是当天提交的汇总，每仓库每天一行
+        key = event.created_at[:10] if event.type == 'PushEvent' else event.url or event.tag or event.created_at
+        return f"{event.type}:{event.repo}:{key}"
+
+    # 写入一个仓库的事件并推进高水位
+    def ingest(self, repo: str, events: List[RepoEvent]) -> None:
+        """写入事件（按id去重，payload存为精简格式），只有带GitHub事件id的事件会推进高水位"""
+        rows = [(self.event_id(e), e.repo, e.type, e.created_at, e.actor,
+                 json.dumps(e.payload(), ensure_ascii=False))
+                for e in events]
+        # 合成事件（如HotPullRequest）来自其他接口，不能代表/events的读取进度
+        marks = [e.created_at for e in events if e.id]
+        with self._lock, self.conn:
+            self.conn.executemany("""
+                INSERT INTO events (id, repo, type, created_at, actor, payload) VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(id) DO UPDATE SET created_at = excluded.created_at, payload = excluded.payload
+            """, rows)
+            if marks:
+                self.conn.execute("""
+                    INSERT INTO repo_state (repo, high_water) VALUES (?, ?)
+                    ON CONFLICT(repo) DO UPDATE SET high_water = MAX(high_water, excluded.high_water)
+                """, (repo, max(marks)))
+
+    # 仓库已入库事件的高水位
+    def high_water(self, repo: str) -> Optional[datetime]:
+        with self._lock:
+            row = self.conn.execute('SELECT high_water FROM repo_state WHERE repo = ?', (repo,)).fetchone()
+        if not row or not row[0]:
+            return None
+        return datetime.fromisoformat(row[0].replace('Z', '+00:00'))
+
+    # 按时间窗口查询事件
+    def query_events(self, since: datetime, until: Optional[datetime] = None,
+                     repos: Optional[List[str]] = None, types: Optional[List[str]] = None,
+                     per_repo_limit: Optional[int] = None) -> List[RepoEvent]:
+        """
+        查询时间窗口内的事件，按时间倒序返回
+        （早期版本存储的原始GitHub payload在读取时同样投影为RepoEvent）
+        :param repos: 只查询这些仓库
+        :param types: 只查询这些事件类型
+        :param per_repo_limit: 每个仓库最多返回的事件数
+        """
+        sql = 'SELECT id, repo, type, created_at, actor, payload FROM events WHERE created_at >= ?'
+        params = [since.strftime('%Y-%m-%dT%H:%M:%SZ')]
+        if until:
+            sql += ' AND created_at < ?'
+            params.append(until.strftime('%Y-%m-%dT%H:%M:%SZ'))
+        # 仓库很多时超出SQLite参数个数限制，改为在读取结果时过滤
+        wanted = set(repos) if repos is not None and len(repos) > 500 else None
+        if repos is not None and wanted is None:
+            sql += f" AND repo IN ({','.join('?' * len(repos))})"
+            params.extend(repos)
+        if types:
+            sql += f" AND type IN ({','.join('?' * len(types))})"
+            params.extend(types)
+        sql += ' ORDER BY created_at DESC'
+        with self._lock:
+            rows = self.conn.execute(sql, params).fetchall()
+
+        events = []
+        per_repo = {}
+        for event_id, repo, event_type, created_at, actor, payload in rows:
+            if wanted is not None and repo not in wanted:
+                continue
+            if per_repo_limit is not None:
+                per_repo[repo] = per_repo.get(repo, 0) + 1
+                if per_repo[repo] > per_repo_limit:
+                    continue
+            # 合成事件的id是派生的，不作为GitHub事件id
+            github_id = event_id if ':' not in event_id else ''
+            events.append(RepoEvent.create(event_type, repo, actor, created_at, github_id,
+                                           json.loads(payload) if payload else None))
+        return events
+
+    # 各仓库的轮询历史
+    def poll_history(self, since: datetime) -> Dict[str, Dict[str, Any]]:
+        """
+        返回 仓库 -> {'last_polled': 上次轮询时间或None, 'events': since之后入库的事件数,
+        'last_event': since之后最新事件的时间或None}
+        """
+        with self._lock:
+            polls = self.conn.execute('SELECT repo, last_polled FROM repo_polls').fetchall()
+            counts = self.conn.execute('SELECT repo, COUNT(*), MAX(created_at) FROM events WHERE created_at >= ? '
+                                       'GROUP BY repo', (since.strftime('%Y-%m-%dT%H:%M:%SZ'),)).fetchall()
+        history = {repo: {'last_polled': datetime.fromisoformat(at.replace('Z', '+00:00')), 'events': 0,
+                          'last_event': None}
+                   for repo, at in polls}
+        for repo, count, last_event in counts:
+            state = history.setdefault(repo, {'last_polled': None, 'events': 0, 'last_event': None})
+            state['events'] = count
+            state['last_event'] = datetime.fromisoformat(last_event.replace('Z', '+00:00'))
+        return history
+
+    # 记录仓库的轮询时间
+    def record_polls(self, repos: List[str], at: Optional[datetime] = None) -> None:
+        at = (at or datetime.now(timezone.utc)).strftime('%Y-%m-%dT%H:%M:%SZ')
+        with self._lock, self.conn:
+            self.conn.executemany('INSERT OR REPLACE INTO repo_polls (repo, last_polled) VALUES (?, ?)',
+                                  [(repo, at) for repo in repos])
+
+    # 记录一次播报
+    def record_broadcast(self, at: Optional[datetime] = None) -> None:
+        at = at or datetime.now(timezone.utc)
+        with self._lock, self.conn:
+            self.conn.execute('INSERT OR REPLACE INTO broadcasts (at) VALUES (?)',
+                              (at.strftime('%Y-%m-%dT%H:%M:%SZ'),))
+
+    # 上一次播报时间
+    def last_broadcast(self) -> Optional[datetime]:
+        with self._lock:
+            row = self.conn.execute('SELECT MAX(at) FROM broadcasts').fetchone()
+        if not row or not row[0]:
+            return None
+        return datetime.fromisoformat(row[0].replace('Z', '+00:00'))
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+# 按活跃度挑选本次要轮询的仓库
+def schedule_repo_polls(repos: List[Dict[str, Any]], store: Optional[EventStore] = None,
+                        budget: int = POLL_REQUEST_BUDGET, backend: str = GITHUB_BACKEND,
+                        now: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """
+    为每个仓库估计事件频率（近期历史事件数与最近活跃时间推算的频率取较大者；最近活跃时间取pushed_at
+    和事件库中最新事件时间的较晚者），给出自适应轮询间隔：
+    约为预计产生一个新事件的时间，限制在 POLL_MIN_INTERVAL_MINUTES ~ POLL_MAX_INTERVAL_HOURS 之间。
+    到期的仓库（含从未轮询、上次轮询后又有推送的仓库）按预计新事件数排序，直到用完请求预算
+    （updated_at在star和仓库信息变更时也会更新，不用作活跃度依据）
+    :param repos: starred仓库列表
+    :param store: 事件库，提供历史事件数和上次轮询时间；为None时所有仓库都视为到期
+    :param budget: 本次运行的请求预算（REST每个仓库2次请求，GraphQL每GRAPHQL_BATCH_SIZE个仓库1次）
+    :return: 本次要轮询的仓库，按优先级排序
+    """
+    now = now or datetime.now(timezone.utc)
+    history = store.poll_history(now - timedelta(days=POLL_HISTORY_DAYS)) if store else {}
+    min_interval = POLL_MIN_INTERVAL_MINUTES / 60
+    max_interval = POLL_MAX_INTERVAL_HOURS
+
+    due = []
+    for repo in repos:
+        pushed = repo.get('pushed_at')
+        pushed_at = datetime.fromisoformat(pushed.replace('Z', '+00:00')) if pushed else None
+        state = history.get(repo['full_name'], {})
+        # starred列表中的pushed_at可能是上次同步时的旧值，事件库里更新的事件同样说明仓库近期活跃
+        last_active = max(filter(None, [pushed_at, state.get('last_event')]), default=None)
+        hours_since_push = (now - last_active).total_seconds() / 3600 if last_active else max_interval
+        # 每小时事件数：刚推送过的仓库先验上更活跃，历史事件多的仓库按实际频率
+        rate = max(state.get('events', 0) / (POLL_HISTORY_DAYS * 24), 1 / (1 + max(hours_since_push, 0)))
+        interval = min(max(1 / rate, min_interval), max_interval)
+
+        last_polled = state.get('last_polled')
+        if last_polled is None:
+            elapsed, pushed_since_poll = max_interval, False
+        else:
+            elapsed = (now - last_polled).total_seconds() / 3600
+            pushed_since_poll = pushed_at is not None and pushed_at > last_polled
+            if elapsed < interval and not (pushed_since_poll and elapsed >= min_interval):
+                continue
+        # 优先级：距上次轮询预计产生的新事件数，上次轮询后有推送的至少算一个
+        due.append((rate * elapsed + (1 if pushed_since_poll else 0), repo))
+
+    due.sort(key=lambda item: item[0], reverse=True)
+    per_repo_cost = 1 / GRAPHQL_BATCH_SIZE if backend == 'graphql' else 2
+    selected = [repo for _, repo in due[:max(0, int(budget / per_repo_cost))]]
+    print(f"🗓️ {len(due)}/{len(repos)} 个仓库到期，按请求预算 {budget} 本次轮询 {len(selected)} 个")
+    return selected
 
 
 # 获取仓库过去24小时的重要事件
-def get_repo_recent_events(owner: str, repo: str) -> List[Dict[str, Any]]:
-    """获取仓库过去24小时的重要事件"""
-    headers = {'Authorization': f'token {GITHUB_TOKEN}'}
-    twenty_four_hours_ago = datetime.now(timezone.utc) - timedelta(hours=24)
+def get_repo_recent_events(owner: str, repo: str, client: Optional[GitHubClient] = None,
+                           since: Optional[datetime] = None,
+                           limit: Optional[int] = 10) -> Optional[List[RepoEvent]]:
+    """
+    获取仓库过去24小时的重要事件，原始事件在解析时即投影为RepoEvent
+    :param since: 起始时间，默认24小时前
+    :param limit: 最多返回的事件数，None表示不限制（写入事件库时使用）
+    :return: 事件列表；获取失败时返回None，以便调用方区分"没有新事件"和"抓取失败"
+    """
+    client = client or get_github_client()
+    since = since or datetime.now(timezone.utc) - timedelta(hours=24)
     
     important_events = []
     
     try:
-        # 获取events
-        events_url = f'https://api.github.com/repos/{owner}/{repo}/events'
-        events_response = requests.get(events_url, headers=headers)
-        
-        if events_response.status_code == 200:
-            events = events_response.json()
+        # 获取events：接口按时间倒序返回，逐页读取直到遇到早于起始时间的事件
+        # created_at均为UTC的 'YYYY-MM-DDTHH:MM:SSZ'，直接比较字符串即可，无需逐个解析时间
+        since_iso = since.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+        events_url = f'{GITHUB_API_URL}/repos/{owner}/{repo}/events?per_page=100'
+        while events_url:
+            events_status, events, events_response = client.get_json(events_url)
+            # 任何一页失败都按抓取失败处理：只读到前几页时返回部分事件会推进高水位，跳过的事件再也不会被抓取
+            if events_status != 200:
+                raise RuntimeError(f"获取事件失败: {events_status} - {events_response.text[:200]}")
+            reached_cutoff = False
             for event in events:
-                event_time = datetime.fromisoformat(event['created_at'].replace('Z', '+00:00'))
-                if event_time >= twenty_four_hours_ago:
-                    # 筛选重要事件类型
-                    if event['type'] in ['PushEvent', 'PullRequestEvent', 'IssuesEvent', 'ReleaseEvent', 'CreateEvent']:
-                        important_events.append(event)
+                if event['created_at'] < since_iso:
+                    reached_cutoff = True
+                    break
+                # 筛选重要事件类型
+                if event['type'] in IMPORTANT_EVENT_TYPES:
+                    important_events.append(RepoEvent.from_github(event))
+            if reached_cutoff:
+                break
+            events_url = events_response.links.get('next', {}).get('url')
         
         # 获取最新的Pull Requests
-        prs_url = f'https://api.github.com/repos/{owner}/{repo}/pulls?state=all&sort=updated&per_page=10'
-        prs_response = requests.get(prs_url, headers=headers)
+        prs_url = f'{GITHUB_API_URL}/repos/{owner}/{repo}/pulls?state=all&sort=updated&per_page=10'
+        prs_status, prs, _ = client.get_json(prs_url)
         
-        if prs_response.status_code == 200:
-            prs = prs_response.json()
+        if prs_status == 200:
             for pr in prs:
                 pr_updated = datetime.fromisoformat(pr['updated_at'].replace('Z', '+00:00'))
-                if pr_updated >= twenty_four_hours_ago and pr.get('comments', 0) > 5:
+                if pr_updated >= since and pr.get('comments', 0) > 5:
                     # 将热门PR作为特殊事件添加
-                    important_events.append({
-                        'type': 'HotPullRequest',
-                        'created_at': pr['updated_at'],
-                        'actor': {'login': pr['user']['login']},
-                        'repo': {'name': f'{owner}/{repo}'},
-                        'payload': {
-                            'title': pr['title'],
-                            'comments': pr.get('comments', 0),
-                            'state': pr['state'],
-                            'url': pr['html_url']  # 添加PR的URL
-                        }
-                    })
+                    important_events.append(RepoEvent.create(
+                        'HotPullRequest', f'{owner}/{repo}', pr['user']['login'], pr['updated_at'],
+                        payload={'title': pr['title'], 'comments': pr.get('comments', 0),
+                                 'state': pr['state'], 'url': pr['html_url']}))
         
-        return important_events[:10]  # 限制返回数量
+        return important_events[:limit]  # 限制返回数量
         
     except Exception as e:
         print(f"获取 {owner}/{repo} 事件时出错: {e}")
-        return []
+        return None
+
+
+# GraphQL单仓库查询片段（通过别名在一次请求中查询多个仓库）
+GRAPHQL_REPO_FRAGMENT = """
+  r{i}: repository(owner: $owner{i}, name: $name{i}) {{
+    nameWithOwner
+    pullRequests(first: 10, orderBy: {{field: UPDATED_AT, direction: DESC}}) {{
+      nodes {{ title url state createdAt updatedAt author {{ login }} comments {{ totalCount }} }}
+    }}
+    issues(first: 10, orderBy: {{field: UPDATED_AT, direction: DESC}}, filterBy: {{since: $issuesSince}}) {{
+      nodes {{ title url createdAt updatedAt author {{ login }} }}
+    }}
+    releases(first: 5, orderBy: {{field: CREATED_AT, direction: DESC}}) {{
+      nodes {{ tagName name url createdAt author {{ login }} }}
+    }}
+    defaultBranchRef {{
+      target {{
+        ... on Commit {{
+          history(since: $since, first: 100) {{
+            nodes {{ committedDate messageHeadline author {{ name user {{ login }} }} }}
+          }}
+        }}
+      }}
+    }}
+  }}"""
+
+
+# 把GraphQL仓库节点转换为与REST后端相同结构的事件字典
+def _graphql_repo_events(node: Dict[str, Any], since: datetime) -> List[RepoEvent]:
+    """把GraphQL查询结果投影为与get_repo_recent_events相同的RepoEvent列表"""
+    repo_name = node['nameWithOwner']
+    since_iso = since.strftime('%Y-%m-%dT%H:%M:%SZ')
+    events = []
+
+    def login(author):
+        return (author or {}).get('login') or 'ghost'
+
+    for pr in node['pullRequests']['nodes']:
+        comments = pr['comments']['totalCount']
+        if pr['createdAt'] >= since_iso:
+            events.append(RepoEvent.create('PullRequestEvent', repo_name, login(pr['author']), pr['createdAt'],
+                                           payload={'action': 'opened', 'title': pr['title'], 'url': pr['url']}))
+        if pr['updatedAt'] >= since_iso and comments > 5:
+            events.append(RepoEvent.create('HotPullRequest', repo_name, login(pr['author']), pr['updatedAt'],
+                                           payload={'title': pr['title'], 'comments': comments,
+                                                    'state': pr['state'].lower(), 'url': pr['url']}))
+
+    # filterBy.since按更新时间筛选：窗口内新建的记为opened，其余记为updated并使用更新时间
+    for issue in node['issues']['nodes']:
+        opened = issue['createdAt'] >= since_iso
+        events.append(RepoEvent.create('IssuesEvent', repo_name, login(issue['author']),
+                                       issue['createdAt'] if opened else issue['updatedAt'],
+                                       payload={'action': 'opened' if opened else 'updated',
+                                                'title': issue['title'], 'url': issue['url']}))
+
+    for release in node['releases']['nodes']:
+        if release['createdAt'] >= since_iso:
+            events.append(RepoEvent.create('ReleaseEvent', repo_name, login(release['author']), release['createdAt'],
+                                           payload={'tag_name': release['tagName'], 'name': release['name'],
+                                                    'url': release['url']}))
+
+    # 默认分支窗口内的提交按UTC日期合并为每天一个PushEvent，
+    # 事件库按 仓库+日期 覆盖写入，窗口重叠的多次运行不会重复累计提交数
+    target = (node.get('defaultBranchRef') or {}).get('target') or {}
+    days = {}
+    for commit in (target.get('history') or {}).get('nodes') or []:
+        if commit['committedDate'] >= since_iso:
+            days.setdefault(commit['committedDate'][:10], []).append(commit)
+    for commits in days.values():
+        latest = max(commits, key=lambda commit: commit['committedDate'])
+        author = latest['author'] or {}
+        events.append(RepoEvent.create(
+            'PushEvent', repo_name, (author.get('user') or {}).get('login') or author.get('name') or 'ghost',
+            latest['committedDate'],
+            payload={'size': len(commits), 'title': latest['messageHeadline']}))
+
+    events.sort(key=lambda e: e.created_at, reverse=True)
+    return events
+
+
+# 使用一次GraphQL查询获取一批仓库的重要事件
+def get_repos_recent_events_graphql(full_names: List[str], client: Optional[GitHubClient] = None,
+                                    since: Optional[datetime] = None,
+                                    limit: Optional[int] = 10) -> Dict[str, Optional[List[RepoEvent]]]:
+    """
+    通过别名把多个仓库合并到一个GraphQL查询中，获取近期PR（含评论数）、Issue、Release和提交
+    :param full_names: 仓库全名列表（owner/repo），建议不超过GRAPHQL_BATCH_SIZE个
+    :param since: 起始时间，默认24小时前
+    :param limit: 每个仓库最多返回的事件数
+    :return: 仓库全名 -> 事件列表；查询不到的仓库（已删除或无权限）为None
+    """
+    client = client or get_github_client()
+    since = since or datetime.now(timezone.utc) - timedelta(hours=24)
+
+    since_iso = since.strftime('%Y-%m-%dT%H:%M:%SZ')
+    # 提交历史的since是GitTimestamp类型，Issue过滤的since是DateTime类型
+    declarations = ['$since: GitTimestamp!', '$issuesSince: DateTime!']
+    fragments = []
+    variables = {'since': since_iso, 'issuesSince': since_iso}
+    for i, full_name in enumerate(full_names):
+        owner, name = full_name.split('/')
+        declarations.append(f'$owner{i}: String!, $name{i}: String!')
+        variables[f'owner{i}'] = owner
+        variables[f'name{i}'] = name
+        fragments.append(GRAPHQL_REPO_FRAGMENT.format(i=i))
+    query = f"query({', '.join(declarations)}) {{{''.join(fragments)}\n}}"
+
+    data = client.graphql(query, variables)
+    results = {}
+    for i, full_name in enumerate(full_names):
+        node = data.get(f'r{i}')
+        results[full_name] = _graphql_repo_events(node, since)[:limit] if node else None
+    return results
+
+
+# 并发获取多个仓库的重要事件
+def fetch_repos_events(repos: List[Dict[str, Any]], max_workers: int = GITHUB_MAX_WORKERS,
+                       client: Optional[GitHubClient] = None, backend: str = GITHUB_BACKEND,
+                       since: Optional[datetime] = None,
+                       store: Optional['EventStore'] = None) -> List[RepoEvent]:
+    """
+    使用线程池并发获取仓库事件，按传入仓库顺序合并结果
+    :param repos: starred仓库列表
+    :param max_workers: 最大并发线程数
+    :param client: GitHub客户端，所有线程共享其连接池和速率限制状态
+    :param backend: 'rest' 每个仓库调用get_repo_recent_events；'graphql' 每GRAPHQL_BATCH_SIZE个仓库一次查询
+    :param since: 起始时间，默认24小时前
+    :param store: 事件库；提供时每个仓库只抓取其高水位之后的事件，把抓到的事件全部写入事件库，
+                  并只为抓取成功的仓库记录轮询时间（失败的仓库下次仍会被调度）
+    """
+    client = client or get_github_client()
+    since = since or datetime.now(timezone.utc) - timedelta(hours=24)
+    limit = None if store else 10
+    results = {}
+    polled = []
+
+    metrics = get_run_metrics()
+
+    def repo_since(full_name):
+        high_water = store.high_water(full_name) if store else None
+        return max(since, high_water) if high_water else since
+
+    def fetch_repo(full_name):
+        with metrics.span('repo_fetch', repo=full_name):
+            return get_repo_recent_events(*full_name.split('/'), client, repo_since(full_name), limit)
+
+    def fetch_batch(batch):
+        with metrics.span('repo_batch_fetch', repos=len(batch)):
+            return get_repos_recent_events_graphql(batch, client, since, limit)
+
+    def collect(full_name, events):
+        # 抓取失败的仓库不入库、不记录轮询，也不推进高水位
+        if events is None:
+            metrics.incr('repo_fetch_failures')
+            events = []
+        elif store:
+            store.ingest(full_name, events)
+            polled.append(full_name)
+        results[full_name] = events
+        return events
+
+    with metrics.span('events_fetch', repos=len(repos), backend=backend), \
+            ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        if backend == 'graphql':
+            names = [repo['full_name'] for repo in repos]
+            batches = [names[i:i + GRAPHQL_BATCH_SIZE] for i in range(0, len(names), GRAPHQL_BATCH_SIZE)]
+            # 值为批次（list）或REST回退的单个仓库（str）
+            pending = {executor.submit(fetch_batch, batch): batch for batch in batches}
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task = pending.pop(future)
+                    if isinstance(task, str):
+                        collect(task, future.result())
+                    else:
+                        try:
+                            batch_results = future.result()
+                        except Exception as e:
+                            # GraphQL整批失败时回退到REST，各仓库提交到线程池并发抓取，不阻塞其他批次结果的收集
+                            print(f"⚠️ GraphQL批量查询失败: {e}，回退到REST")
+                            for full_name in task:
+                                pending[executor.submit(fetch_repo, full_name)] = full_name
+                            continue
+                        for full_name, events in batch_results.items():
+                            collect(full_name, events)
+                    print(f"📊 已完成 {len(results)}/{len(repos)} 个仓库")
+        else:
+            futures = {executor.submit(fetch_repo, repo['full_name']): repo['full_name'] for repo in repos}
+            for done, future in enumerate(as_completed(futures), start=1):
+                full_name = futures[future]
+                events = collect(full_name, future.result())
+                if events:
+                    print(f"📊 {full_name} ({done}/{len(repos)}) ✅ 发现 {len(events)} 个重要事件")
+                else:
+                    print(f"📊 {full_name} ({done}/{len(repos)})")
+
+    if store:
+        store.record_polls(polled)
+
+    all_events = []
+    for repo in repos:
+        all_events.extend(results.get(repo['full_name'], []))
+    metrics.incr('events_fetched', len(all_events))
+    return all_events
+
+
+# 用预编译XPath解析trending页面（lxml）
+def _parse_trending_lxml(html: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """使用lxml的C解析器和预编译XPath解析trending页面"""
+    def text_of(nodes, default):
+        return nodes[0].text_content().strip() if nodes else default
+
+    trending_repos = []
+    for article in _TRENDING_XPATH['articles'](lxml_html.fromstring(html)):
+        try:
+            # 获取仓库名称
+            hrefs = _TRENDING_XPATH['title'](article)
+            if not hrefs:
+                continue
+            trending_repos.append({
+                'name': hrefs[0].strip().strip('/'),
+                'description': text_of(_TRENDING_XPATH['description'](article), ''),
+                'stars_today': text_of(_TRENDING_XPATH['stars_today'](article), '0'),
+                'total_stars': text_of(_TRENDING_XPATH['total_stars'](article), '0'),
+                'language': text_of(_TRENDING_XPATH['language'](article), 'Unknown')
+            })
+            if limit is not None and len(trending_repos) >= limit:
+                break
+        except Exception as e:
+            print(f"解析trending仓库时出错: {e}")
+            continue
+    return trending_repos
+
+
+# 用BeautifulSoup解析trending页面（lxml不可用时的备用方案）
+def _parse_trending_bs4(html: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """使用BeautifulSoup的html.parser解析trending页面"""
+    soup = BeautifulSoup(html, 'html.parser')
+
+    trending_repos = []
+    for article in soup.select('article.Box-row'):
+        try:
+            # 获取仓库名称
+            title_elem = article.select_one('h2.h3 a')
+            if not title_elem:
+                continue
+                
+            title = title_elem.get('href').strip('/')
+            
+            # 获取描述
+            desc_elem = article.select_one('p.col-9')
+            description = desc_elem.text.strip() if desc_elem else ''
+            
+            # 获取今日star数
+            stars_today_elem = article.select_one('span.d-inline-block.float-sm-right')
+            stars_today = stars_today_elem.text.strip() if stars_today_elem else '0'
+            
+            # 获取总star数
+            total_stars_elem = article.select_one('a[href*="/stargazers"]')
+            total_stars = total_stars_elem.text.strip() if total_stars_elem else '0'
+            
+            # 获取编程语言
+            lang_elem = article.select_one('span[itemprop="programmingLanguage"]')
+            language = lang_elem.text.strip() if lang_elem else 'Unknown'
+
+            trending_repos.append({
+                'name': title,
+                'description': description,
+                'stars_today': stars_today,
+                'total_stars': total_stars,
+                'language': language
+            })
+            
+            if limit is not None and len(trending_repos) >= limit:
+                break
+        except Exception as e:
+            print(f"解析trending仓库时出错: {e}")
+            continue
+
+    return trending_repos
+
+
+# 读取trending缓存（内存优先，其次磁盘）
+def load_trending_cache(since: str, language: str) -> Optional[List[Dict[str, Any]]]:
+    """返回未过期（TRENDING_CACHE_TTL秒内）的trending结果，没有则返回None"""
+    key = (since, language)
+    now = time.time()
+    with _trending_cache_lock:
+        entry = _trending_cache.get(key)
+    if entry is None:
+        try:
+            with open(_trending_cache_path(since, language), 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+    if now - entry['fetched_at'] > TRENDING_CACHE_TTL:
+        return None
+    with _trending_cache_lock:
+        _trending_cache[key] = entry
+    return entry['repos']
+
+
+# 写入trending缓存
+def save_trending_cache(since: str, language: str, repos: List[Dict[str, Any]]) -> None:
+    entry = {'fetched_at': time.time(), 'repos': repos}
+    with _trending_cache_lock:
+        _trending_cache[(since, language)] = entry
+    path = _trending_cache_path(since, language)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"⚠️ 写入trending缓存失败: {e}")
+
+
+# trending缓存文件路径
+def _trending_cache_path(since: str, language: str) -> str:
+    return os.path.join(CACHE_DIR, 'trending', f"{since}-{quote(language or 'all', safe='')}.json")
 
 
 # 获取GitHub Trending仓库
-def get_trending_repos() -> List[Dict[str, Any]]:
-    """获取GitHub今日trending仓库"""
+def get_trending_repos(client: Optional[GitHubClient] = None, since: str = 'daily', language: str = '',
+                       limit: int = 10) -> List[Dict[str, Any]]:
+    """
+    获取GitHub trending仓库，整页解析结果按(since, language)缓存TRENDING_CACHE_TTL秒，读取时再按limit截取
+    :param since: 'daily' / 'weekly' / 'monthly'
+    :param language: 编程语言（如 'python'），为空表示所有语言
+    :param limit: 最多返回的仓库数
+    """
+    cached = load_trending_cache(since, language)
+    if cached is not None:
+        get_run_metrics().incr('cache_hits', cache='trending')
+        return cached[:limit]
+
+    client = client or get_github_client()
     try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
-        }
-        response = requests.get('https://github.com/trending?since=daily', headers=headers)
-        soup = BeautifulSoup(response.text, 'html.parser')
+        with get_run_metrics().span('trending_scrape', since=since, language=language):
+            headers = {
+                'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
+            }
+            url = f"{GITHUB_WEB_URL}/trending/{quote(language.lower(), safe='')}?since={since}" if language \
+                else f'{GITHUB_WEB_URL}/trending?since={since}'
+            response = client.request('GET', url, headers=headers)
+            response.raise_for_status()
 
-        trending_repos = []
-        for article in soup.select('article.Box-row'):
-            try:
-                # 获取仓库名称
-                title_elem = article.select_one('h2.h3 a')
-                if not title_elem:
-                    continue
-                    
-                title = title_elem.get('href').strip('/')
-                
-                # 获取描述
-                desc_elem = article.select_one('p.col-9')
-                description = desc_elem.text.strip() if desc_elem else ''
-                
-                # 获取今日star数
-                stars_today_elem = article.select_one('span.d-inline-block.float-sm-right')
-                stars_today = stars_today_elem.text.strip() if stars_today_elem else '0'
-                
-                # 获取总star数
-                total_stars_elem = article.select_one('a[href*="/stargazers"]')
-                total_stars = total_stars_elem.text.strip() if total_stars_elem else '0'
-                
-                # 获取编程语言
-                lang_elem = article.select_one('span[itemprop="programmingLanguage"]')
-                language = lang_elem.text.strip() if lang_elem else 'Unknown'
-
-                trending_repos.append({
-                    'name': title,
-                    'description': description,
-                    'stars_today': stars_today,
-                    'total_stars': total_stars,
-                    'language': language
-                })
-                
-                if len(trending_repos) >= 10:  # 限制10个结果
-                    break
-            except Exception as e:
-                print(f"解析trending仓库时出错: {e}")
-                continue
+            # 缓存整页结果：缓存键不含limit，之后limit更大的调用也能命中
+            if LXML_AVAILABLE:
+                trending_repos = _parse_trending_lxml(response.text)
+            else:
+                trending_repos = _parse_trending_bs4(response.text)
 
-        return trending_repos
+        if trending_repos:
+            save_trending_cache(since, language, trending_repos)
+        return trending_repos[:limit]
     except Exception as e:
         print(f"获取trending仓库失败: {e}")
         return []
 
+
+# 并行获取多个语言/周期的trending列表
+def get_trending_repos_multi(specs: List[Tuple[str, str]], client: Optional[GitHubClient] = None,
+                             limit: int = 10) -> Dict[Tuple[str, str], List[Dict[str, Any]]]:
+    """
+    并行抓取多个trending页面
+    :param specs: (since, language) 列表，如 [('daily', 'python'), ('weekly', '')]
+    :return: (since, language) -> trending仓库列表
+    """
+    client = client or get_github_client()
+    with ThreadPoolExecutor(max_workers=max(1, min(len(specs), GITHUB_MAX_WORKERS))) as executor:
+        futures = {executor.submit(get_trending_repos, client, since, language, limit): (since, language)
+                   for since, language in specs}
+        return {futures[future]: future.result() for future in as_completed(futures)}
+
+
+# 合并多个trending列表（轮流取各列表的前几名并去重）
+def merge_trending_lists(lists: List[List[Dict[str, Any]]], limit: int = 10) -> List[Dict[str, Any]]:
+    merged = []
+    seen = set()
+    for rank in range(max((len(lst) for lst in lists), default=0)):
+        for lst in lists:
+            if rank < len(lst) and lst[rank]['name'] not in seen:
+                seen.add(lst[rank]['name'])
+                merged.append(lst[rank])
+    return merged[:limit]
+
+
+# 获取今日trending（配置了TRENDING_LANGUAGES时并行抓取各语言页面后合并）
+def fetch_daily_trending(client: Optional[GitHubClient] = None) -> List[Dict[str, Any]]:
+    print("🔥 获取今日GitHub热门项目...")
+    if TRENDING_LANGUAGES:
+        trending_lists = get_trending_repos_multi([('daily', lang) for lang in TRENDING_LANGUAGES], client)
+        trending_repos = merge_trending_lists([trending_lists[('daily', lang)] for lang in TRENDING_LANGUAGES])
+    else:
+        trending_repos = get_trending_repos(client)
+    print(f"📈 找到 {len(trending_repos)} 个热门项目")
+    return trending_repos
+
+
 def get_response(client, model, messages) -> str:
     response = client.chat.completions.create(
                 model=model,
@@ -331,90 +2222,341 @@ def get_response(client, model, messages) -> str:
             )
     return response
 
+# 获取LLM客户端（进程内复用）
+def get_llm_client() -> Tuple[Any, str]:
+    """
+    根据MODEL创建OpenAI兼容客户端并缓存，后续调用复用同一个客户端和连接池
+    :return: (客户端, 模型名称)
+    """
+    global _llm_client
+    with _llm_client_lock:
+        if _llm_client is None:
+            from openai import OpenAI
+            if MODEL == "DEEPSEEK":
+                _llm_client = (OpenAI(api_key=MODEL_API_KEY, base_url=MODEL_BASE_URL or "https://api.deepseek.com"),
+                               "deepseek-chat")
+            elif MODEL == "OPENAI":
+                _llm_client = (OpenAI(api_key=MODEL_API_KEY, base_url=MODEL_BASE_URL), "gpt-3.5-turbo")
+            else:
+                raise ValueError(f"not supported model type: {MODEL}")
+        return _llm_client
+
+
+# 各类事件在提示词中的基础重要性
+EVENT_TYPE_IMPORTANCE = {'ReleaseEvent': 10.0, 'HotPullRequest': 8.0, 'PullRequestEvent': 5.0, 'IssuesEvent': 3.0,
+                         'CreateEvent': 2.0, 'PushEvent': 2.0}
+
+_SUMMARY_PROMPT_HEADER = "请为我播报今日GitHub动态摘要，用轻松的语调：\n\n"
+_SUMMARY_PROMPT_REQUIREMENTS = "\n要求1：读取pr的内容并简单总结\n要求2：总结内容不要带上url\n要求3：总结不要带表情包\n请用自然、口语化的中文总结，就像朋友间的聊天，重点突出有趣的项目和重要更新。对于提供了URL的重要PR，请访问这些URL并总结其中的关键内容和变更。控制在300字以内。"
+
+
+# 提示词中的一条聚合动态
+class EventDigest(NamedTuple):
+    repo: str
+    type: str
+    score: float  # 重要性（已按同仓库条目数衰减）
+    line: str  # 写入提示词的文本
+    events: Tuple[RepoEvent, ...]  # 被聚合的事件
+
+
+# 估算文本的token数
+def estimate_tokens(text: str) -> int:
+    """不依赖分词器的近似估算：非ASCII字符（中文等）每字按1个token，ASCII每4个字符按1个token"""
+    non_ascii = sum(1 for ch in text if ord(ch) > 127)
+    return non_ascii + (len(text) - non_ascii + 3) // 4
+
+
+def _quoted_titles(titles: List[str], limit: int = 3) -> str:
+    text = '、'.join(f"'{title[:60]}'" for title in titles[:limit])
+    return text + (f" 等{len(titles)}个" if len(titles) > limit else '')
+
+
+# 按仓库和事件类型聚合事件
+def aggregate_events(starred_events: List[RepoEvent]) -> List[EventDigest]:
+    """
+    同一仓库的同类事件合并为一条：推送合并为提交数，PR/Issue合并为标题列表，Release和CreateEvent合并为tag列表；
+    热门PR各自单独成条（带URL）。按 基础重要性 x 活跃量 排序，同一仓库的第k条再乘以0.5^k，
+    使预算优先覆盖更多仓库，而不是被同一仓库的大量推送挤满
+    """
+    groups = {}
+    for event in starred_events:
+        detail = EventStore.event_id(event) if event.type == 'HotPullRequest' else ''
+        groups.setdefault((event.repo, event.type, detail), []).append(event)
+
+    digests = []
+    for (repo, event_type, _), events in groups.items():
+        # 组内按时间从新到旧，标题列表和最新提交与输入顺序无关
+        events.sort(key=lambda event: (event.created_at, event.id), reverse=True)
+        actors = list(dict.fromkeys(event.actor for event in events))
+        who = actors[0] if len(actors) == 1 else f"{actors[0]}等{len(actors)}人"
+        titles = list(dict.fromkeys(event.title for event in events if event.title))
+        volume = len(events)
+        if event_type == 'HotPullRequest':
+            event = events[0]
+            line = f"- {repo}: 热门PR '{event.title}' 收到了{event.comments}条评论"
+            if event.url:
+                line += f"\n  URL: {event.url}"
+            volume = event.comments
+        elif event_type == 'ReleaseEvent':
+            tags = list(dict.fromkeys(event.tag or event.title for event in events if event.tag or event.title))
+            line = f"- {repo}: {who} 发布了新版本" + (f" {'、'.join(tags[:3])}" if tags else '')
+        elif event_type == 'PushEvent':
+            volume = sum(event.commits for event in events) or len(events)
+            latest = events[0].title
+            line = f"- {repo}: {who} 推送了{volume}个提交" + (f"，最新: '{latest[:60]}'" if latest else '')
+        elif event_type in ('PullRequestEvent', 'IssuesEvent'):
+            noun = 'Pull Request' if event_type == 'PullRequestEvent' else 'Issue'
+            volume = len(titles) or len(events)
+            line = f"- {repo}: {who} 提交或更新了{volume}个{noun}" + (f": {_quoted_titles(titles)}" if titles else '')
+        elif event_type == 'CreateEvent':
+            refs = list(dict.fromkeys(event.tag for event in events if event.tag))
+            line = f"- {repo}: {who} 新建了" + (f" {'、'.join(refs[:3])}" if refs else '分支或标签')
+        else:
+            line = f"- {repo}: {who} 进行了{len(events)}次{event_type}操作"
+        score = EVENT_TYPE_IMPORTANCE.get(event_type, 1.0) * (1 + math.log1p(volume) / 4)
+        digests.append(EventDigest(repo, event_type, score, line, tuple(events)))
+
+    # 分数相同时按仓库名排序，保证同样的输入总是选出同样的条目（摘要缓存键依赖于此）
+    digests.sort(key=lambda digest: (-digest.score, digest.repo, digest.type, digest.line))
+    seen = {}
+    decayed = []
+    for digest in digests:
+        rank = seen.get(digest.repo, 0)
+        seen[digest.repo] = rank + 1
+        decayed.append(digest._replace(score=digest.score * 0.5 ** rank))
+    decayed.sort(key=lambda digest: (-digest.score, digest.repo, digest.type, digest.line))
+    return decayed
+
+
+def _trending_prompt_section(trending_repos: List[Dict[str, Any]]) -> str:
+    if not trending_repos:
+        return ''
+    section = "\n## 今日GitHub热门项目 ##\n"
+    for repo in trending_repos[:5]:  # 只取前5个
+        desc = repo['description'][:50] + '...' if len(repo['description']) > 50 else repo['description']
+        section += f"- {repo['name']} ({repo['language']}): {desc} - 今日+{repo['stars_today']}⭐\n"
+    return section
+
+
+# 在token预算内挑选进入提示词的动态
+def select_prompt_events(starred_events: List[RepoEvent], trending_repos: List[Dict[str, Any]],
+                         budget: int = PROMPT_TOKEN_BUDGET) -> Tuple[List[EventDigest], int]:
+    """
+    提示词的固定部分（说明、trending、要求）之外的预算按重要性依次装入聚合动态，
+    放不下的条目跳过并继续尝试后面更短的条目
+    :return: (入选的条目，按重要性排序; 未入选的事件数)
+    """
+    fixed = (_SUMMARY_PROMPT_HEADER + "## 你关注的仓库动态 ##\n" + _trending_prompt_section(trending_repos)
+             + _SUMMARY_PROMPT_REQUIREMENTS + "- 另有0000条较次要的动态未列出\n")
+    remaining = budget - estimate_tokens(fixed)
+    selected = []
+    omitted = 0
+    for digest in aggregate_events(starred_events):
+        cost = estimate_tokens(digest.line) + 1
+        if cost <= remaining:
+            selected.append(digest)
+            remaining -= cost
+        else:
+            omitted += len(digest.events)
+    return selected, omitted
+
+
+# 构建摘要提示词
+def build_summary_prompt(starred_events: List[RepoEvent], trending_repos: List[Dict[str, Any]],
+                         budget: int = PROMPT_TOKEN_BUDGET) -> str:
+    """把事件聚合、排序后在token预算内整理为LLM提示词"""
+    prompt = _SUMMARY_PROMPT_HEADER + "## 你关注的仓库动态 ##\n"
+    if starred_events:
+        selected, omitted = select_prompt_events(starred_events, trending_repos, budget)
+        prompt += ''.join(digest.line + '\n' for digest in selected)
+        if omitted:
+            prompt += f"- 另有{omitted}条较次要的动态未列出\n"
+    else:
+        prompt += "今日暂无重要更新\n"
+    prompt += _trending_prompt_section(trending_repos)
+    prompt += _SUMMARY_PROMPT_REQUIREMENTS
+    get_run_metrics().set_gauge('prompt_tokens', estimate_tokens(prompt))
+    return prompt
+
+
+# 摘要缓存键
+def summary_cache_key(starred_events: List[RepoEvent], trending_repos: List[Dict[str, Any]],
+                      model: str, language: str) -> str:
+    """
+    由进入提示词的事件id/类型（与build_summary_prompt按同样的预算挑选）、trending仓库名、模型和语言计算稳定哈希，
+    与事件顺序和评论数等易变字段无关
+    """
+    selected, _ = select_prompt_events(starred_events, trending_repos)
+    normalized = {
+        'events': sorted([EventStore.event_id(e), e.type] for digest in selected for e in digest.events),
+        'trending': sorted(repo['name'] for repo in trending_repos[:5]),
+        'model': model,
+        'language': language,
+    }
+    return hashlib.sha256(json.dumps(normalized, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+# 读取摘要缓存
+def load_summary_cache(key: str) -> Optional[str]:
+    """返回SUMMARY_CACHE_TTL秒内缓存的摘要"""
+    with _summary_cache_lock:
+        entries = _read_summary_cache()
+    entry = entries.get(key)
+    if entry and time.time() - entry['at'] <= SUMMARY_CACHE_TTL:
+        return entry['summary']
+    return None
+
+
+# 写入摘要缓存
+def save_summary_cache(key: str, summary: str) -> None:
+    """写入摘要，同时清理过期条目，并只保留最新的SUMMARY_CACHE_MAX_ENTRIES条"""
+    path = os.path.join(CACHE_DIR, 'summaries.json')
+    now = time.time()
+    with _summary_cache_lock:
+        entries = _read_summary_cache()
+        entries[key] = {'at': now, 'summary': summary}
+        fresh = sorted(((k, v) for k, v in entries.items() if now - v['at'] <= SUMMARY_CACHE_TTL),
+                       key=lambda item: item[1]['at'], reverse=True)[:SUMMARY_CACHE_MAX_ENTRIES]
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            with open(path + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump(dict(fresh), f, ensure_ascii=False)
+            os.replace(path + '.tmp', path)
+        except OSError as e:
+            print(f"⚠️ 写入摘要缓存失败: {e}")
+
+
+def _read_summary_cache() -> Dict[str, Any]:
+    try:
+        with open(os.path.join(CACHE_DIR, 'summaries.json'), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
 # 使用GPT摘要信息
-def summarize_with_gpt(starred_events: List[Dict[str, Any]], trending_repos: List[Dict[str, Any]]) -> str:
-    """使用GPT生成智能摘要"""
+def summarize_with_gpt(starred_events: List[RepoEvent], trending_repos: List[Dict[str, Any]],
+                       language: str = 'auto') -> str:
+    """
+    使用GPT生成智能摘要
+    输入（事件、trending、模型、语言）与缓存中的某次调用相同时直接返回缓存的摘要，跳过LLM请求
+    """
     if not MODEL_API_KEY:
         return generate_simple_summary(starred_events, trending_repos)
-    
-    prompt = "请为我播报今日GitHub动态摘要，用轻松的语调：\n\n"
-    
-    # 处理starred仓库的重要事件
-    if starred_events:
-        prompt += "## 你关注的仓库动态 ##\n"
-        for event in starred_events[:8]:  # 限制事件数量
-            repo_name = event['repo']['name']
-            event_type = event['type']
-            actor = event['actor']['login']
-            
-            if event_type == 'HotPullRequest':
-                title = event['payload']['title']
-                comments = event['payload']['comments']
-                pr_url = event['payload'].get('url', '')
-                if pr_url:
-                    prompt += f"- {repo_name}: 热门PR '{title}' 收到了{comments}条评论\n  URL: {pr_url}\n"
-                else:
-                    prompt += f"- {repo_name}: 热门PR '{title}' 收到了{comments}条评论\n"
-            elif event_type == 'ReleaseEvent':
-                prompt += f"- {repo_name}: {actor} 发布了新版本\n"
-            elif event_type == 'PullRequestEvent':
-                prompt += f"- {repo_name}: {actor} 提交了新的Pull Request\n"
-            elif event_type == 'IssuesEvent':
-                prompt += f"- {repo_name}: {actor} 创建或更新了Issue\n"
-            else:
-                prompt += f"- {repo_name}: {actor} 进行了{event_type}操作\n"
-    else:
-        prompt += "## 你关注的仓库动态 ##\n今日暂无重要更新\n"
-    
-    # 处理trending仓库
-    if trending_repos:
-        prompt += "\n## 今日GitHub热门项目 ##\n"
-        for repo in trending_repos[:5]:  # 只取前5个
-            name = repo['name']
-            desc = repo['description'][:50] + '...' if len(repo['description']) > 50 else repo['description']
-            stars_today = repo['stars_today']
-            language = repo['language']
-            prompt += f"- {name} ({language}): {desc} - 今日+{stars_today}⭐\n"
-    
-    prompt += "\n要求1：读取pr的内容并简单总结\n要求2：总结内容不要带上url\n要求3：总结不要带表情包\n请用自然、口语化的中文总结，就像朋友间的聊天，重点突出有趣的项目和重要更新。对于提供了URL的重要PR，请访问这些URL并总结其中的关键内容和变更。控制在300字以内。"
+
+    cache_key = summary_cache_key(starred_events, trending_repos, MODEL, language) if SUMMARY_CACHE_ENABLED else None
+    if cache_key:
+        cached = load_summary_cache(cache_key)
+        if cached is not None:
+            get_run_metrics().incr('cache_hits', cache='summary')
+            print("♻️ 输入与之前相同，使用缓存的摘要")
+            return cached
+
+    prompt = build_summary_prompt(starred_events, trending_repos)
     
     try:
-        from openai import OpenAI
-        import os
-        # 确保环境变量正确设置
-        print(MODEL_API_KEY)
-        if not MODEL_API_KEY:
-            print("OpenAI API密钥未配置，使用简单摘要")
-            return generate_simple_summary(starred_events, trending_repos)
-            
         # 设置环境变量以避免编码问题
         os.environ['PYTHONIOENCODING'] = 'utf-8'
         messages=[{"role": "user", "content": prompt}]
         
-        if MODEL == "DEEPSEEK":
-            client = OpenAI(api_key=MODEL_API_KEY, base_url="https://api.deepseek.com")
-            response = get_response(client, "deepseek-chat", messages)    
-        elif MODEL == "OPENAI":
-            client = OpenAI(api_key=MODEL_API_KEY, )
-            response = get_response(client, "gpt-3.5-turbo", messages)
-        else:
-            print("not supported model type!")
+        with get_run_metrics().span('llm_summary', prompt_chars=len(prompt)):
+            client, model = get_llm_client()
+            response = get_response(client, model, messages)
 
         result = response.choices[0].message.content
-        return result.strip() if result else ""
+        summary = result.strip() if result else ""
+        if cache_key and summary:
+            save_summary_cache(cache_key, summary)
+        return summary
     except Exception as e:
         print(f"GPT摘要生成失败: {e}")
         return generate_simple_summary(starred_events, trending_repos)
 
 
+# 把流式输出的文本片段切分为完整句子
+def iter_stream_sentences(chunks: Iterable[str]) -> Iterator[str]:
+    """累积文本片段，每出现句末标点就把之前的完整句子切出来，流结束时输出剩余部分"""
+    buffer = ''
+    for chunk in chunks:
+        buffer += chunk
+        last_end = None
+        for match in _SENTENCE_END_RE.finditer(buffer):
+            last_end = match.end()
+        if last_end:
+            complete, buffer = buffer[:last_end], buffer[last_end:]
+            yield from split_sentences(complete)
+    if buffer.strip():
+        yield from split_sentences(buffer)
+
+
+# 流式生成摘要并边生成边播报
+def speak_streaming_summary(tts_engine, starred_events: List[RepoEvent], trending_repos: List[Dict[str, Any]],
+                            language: str = 'auto', speed=1.0) -> str:
+    """
+    以stream=True调用LLM，按句子切分token流并立即送入TTS，首句音频在模型仍在生成时就开始播放；
+    未配置LLM或摘要缓存命中时退化为整段播报
+    :return: 完整的摘要文本
+    """
+    cache_key = summary_cache_key(starred_events, trending_repos, MODEL, language) \
+        if MODEL_API_KEY and SUMMARY_CACHE_ENABLED else None
+    summary = load_summary_cache(cache_key) if cache_key else None
+    if summary is not None:
+        get_run_metrics().incr('cache_hits', cache='summary')
+    elif not MODEL_API_KEY:
+        summary = generate_simple_summary(starred_events, trending_repos)
+    if summary is not None:
+        speak_with_tts(tts_engine, summary, language, speed)
+        return summary
+
+    deltas = []
+
+    def sentences():
+        # span覆盖从发出请求到流结束（期间与合成和播放重叠）
+        with get_run_metrics().span('llm_summary', stream=True):
+            client, model = get_llm_client()
+            response = client.chat.completions.create(
+                model=model,
+                messages=[{"role": "user", "content": build_summary_prompt(starred_events, trending_repos)}],
+                max_tokens=400,
+                temperature=0.7,
+                stream=True
+            )
+
+            def texts():
+                for chunk in response:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        deltas.append(chunk.choices[0].delta.content)
+                        yield chunk.choices[0].delta.content
+
+            for sentence in iter_stream_sentences(texts()):
+                print(f"📻 {sentence}")
+                yield sentence
+
+    try:
+        speak_sentences(tts_engine, sentences(), language, speed)
+    except Exception as e:
+        if deltas:
+            raise
+        # 还没有任何输出时回退到简单摘要
+        print(f"GPT流式摘要生成失败: {e}")
+        summary = generate_simple_summary(starred_events, trending_repos)
+        speak_with_tts(tts_engine, summary, language, speed)
+        return summary
+
+    summary = ''.join(deltas).strip()
+    if cache_key and summary:
+        save_summary_cache(cache_key, summary)
+    return summary
+
+
 # 简单摘要生成（备用方案）
-def generate_simple_summary(starred_events: List[Dict[str, Any]], trending_repos: List[Dict[str, Any]]) -> str:
+def generate_simple_summary(starred_events: List[RepoEvent], trending_repos: List[Dict[str, Any]]) -> str:
     """生成简单的文本摘要"""
     summary = "今日GitHub动态播报：\n\n"
     
     if starred_events:
         summary += f"你关注的仓库中有{len(starred_events)}个重要更新，"
-        hot_prs = [e for e in starred_events if e['type'] == 'HotPullRequest']
+        hot_prs = [e for e in starred_events if e.type == 'HotPullRequest']
         if hot_prs:
             summary += f"其中{len(hot_prs)}个热门PR值得关注。"
     else:
@@ -429,112 +2571,678 @@ def generate_simple_summary(starred_events: List[Dict[str, Any]], trending_repos
     return summary
 
 
-# 主程序
-def main(language='auto'):
-    """主程序入口"""
-    print("🎵 Git Radio 启动中...")
-    
-    # 检查必要的环境变量
-    if not GITHUB_TOKEN or GITHUB_TOKEN == "您的GitHub个人访问令牌":
-        print("❌ 错误: 请在.env文件中设置真实的GITHUB_TOKEN")
-        print("💡 获取方法: https://github.com/settings/tokens")
-        print("🔧 或者运行演示模式: python3 git_radio.py --demo")
-        return
-    
-    # 初始化语音引擎
-    try:
-        tts_engine = init_tts_engine(language)
+# 阶段主动取消下游阶段（不是错误，例如没有starred仓库可播报）
+class StageCancelled(Exception):
+    pass
+
+
+# 阶段依赖图执行器
+class StageGraph:
+    """
+    小型DAG执行器：依赖全部完成的阶段立即启动，互不依赖的阶段在线程池中并发执行，
+    总耗时取决于最长的依赖链而不是各阶段耗时之和
+    - 阶段函数以依赖阶段的结果为关键字参数（参数名即阶段名）
+    - 阶段失败时有fallback则以fallback（参数相同）的结果继续，否则跳过所有下游阶段
+    - main_thread=True的阶段在调用run()的线程中执行（pyttsx3等语音引擎要求在主线程使用）
+    - 依赖只能是已添加的阶段，因此图中不会有环
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.stages = {}
+        self.results = {}
+        self.status = {}  # ok / fallback / failed / cancelled / skipped
+        self.errors = {}
+        self.timing = {}  # 阶段 -> (开始, 结束)，相对run()开始的秒数
+
+    def add(self, name: str, func: Callable[..., Any], deps: Iterable[str] = (),
+            fallback: Optional[Callable[..., Any]] = None, main_thread: bool = False,
+            label: Optional[str] = None) -> None:
+        """
+        :param deps: 依赖的阶段名
+        :param fallback: 阶段失败时的备用函数
+        :param label: 失败提示中使用的阶段描述，默认为阶段名
+        """
+        deps = tuple(deps)
+        if name in self.stages:
+            raise ValueError(f"阶段 {name} 重复定义")
+        for dep in deps:
+            if dep not in self.stages:
+                raise ValueError(f"阶段 {name} 依赖未定义的阶段 {dep}")
+        self.stages[name] = {'func': func, 'deps': deps, 'fallback': fallback, 'main_thread': main_thread,
+                             'label': label or name}
+
+    def run(self) -> Dict[str, Any]:
+        """执行所有阶段直到完成或被跳过，返回各阶段结果"""
+        t0 = time.perf_counter()
+        lock = threading.Lock()
+        main_queue = queue.Queue()
+        waiting = dict.fromkeys(self.stages)  # 尚未启动的阶段（保持添加顺序）
+        workers = sum(1 for stage in self.stages.values() if not stage['main_thread'])
+        executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix=f'{self.name}-stage')
+
+        def dispatch():
+            # 启动依赖已全部完成的阶段，上游失败或被取消的阶段直接跳过（调用方持有lock）
+            progress = True
+            while progress:
+                progress = False
+                for name in list(waiting):
+                    stage = self.stages[name]
+                    if any(dep not in self.status for dep in stage['deps']):
+                        continue
+                    del waiting[name]
+                    progress = True
+                    blocked = [dep for dep in stage['deps']
+                               if self.status[dep] in ('failed', 'cancelled', 'skipped')]
+                    if blocked:
+                        now = time.perf_counter() - t0
+                        self.timing[name] = (now, now)
+                        self.results[name] = None
+                        if self.errors.get(blocked[0]) is not None:
+                            self.errors[name] = self.errors[blocked[0]]
+                        self.status[name] = 'skipped'
+                    elif stage['main_thread']:
+                        main_queue.put(name)
+                    else:
+                        executor.submit(execute, name)
+            if len(self.status) == len(self.stages):
+                main_queue.put(None)
+
+        def execute(name):
+            stage = self.stages[name]
+            kwargs = {dep: self.results[dep] for dep in stage['deps']}
+            start = time.perf_counter() - t0
+            status, result, error = 'ok', None, None
+            try:
+                result = stage['func'](**kwargs)
+            except StageCancelled as e:
+                status, error = 'cancelled', e
+            except Exception as e:
+                error = e
+                if stage['fallback'] is None:
+                    status = 'failed'
+                    print(f"❌ {stage['label']}失败: {e}")
+                else:
+                    print(f"⚠️ {stage['label']}失败: {e}，使用备用方案")
+                    try:
+                        status, result = 'fallback', stage['fallback'](**kwargs)
+                    except Exception as fallback_error:
+                        status, error = 'failed', fallback_error
+                        print(f"❌ {stage['label']}的备用方案也失败了: {fallback_error}")
+            with lock:
+                self.timing[name] = (start, time.perf_counter() - t0)
+                self.results[name] = result
+                if error is not None:
+                    self.errors[name] = error
+                self.status[name] = status
+                dispatch()
+
+        try:
+            with lock:
+                dispatch()
+            while True:
+                name = main_queue.get()
+                if name is None:
+                    break
+                execute(name)
+        finally:
+            executor.shutdown(wait=False)
+        return self.results
+
+    def result(self, name: str) -> Any:
+        """阶段结果；阶段或其上游失败时抛出原始异常，被取消时返回None"""
+        error = self.errors.get(name)
+        if self.status.get(name) in ('failed', 'skipped') and error is not None \
+                and not isinstance(error, StageCancelled):
+            raise error
+        return self.results.get(name)
+
+    def critical_path(self) -> List[str]:
+        """从最晚结束的阶段开始，沿最晚完成的依赖回溯：这条链上的阶段变快才能缩短总耗时（不含被跳过的阶段）"""
+        executed = {name: timing for name, timing in self.timing.items() if self.status[name] != 'skipped'}
+        if not executed:
+            return []
+        name = max(executed, key=lambda stage: executed[stage][1])
+        path = [name]
+        while True:
+            deps = [dep for dep in self.stages[name]['deps'] if dep in executed]
+            if not deps:
+                break
+            name = max(deps, key=lambda dep: self.timing[dep][1])
+            path.append(name)
+        return path[::-1]
+
+    def report(self) -> None:
+        """打印关键路径，并把各阶段耗时写入运行指标（graph_stage_seconds、graph_stage_critical、critical_path_seconds）"""
+        if not self.timing:
+            return
+        path = self.critical_path()
+        total = max(end for _, end in self.timing.values())
+        busy = sum(end - start for start, end in self.timing.values())
+        metrics = get_run_metrics()
+        # 标签只用图名和阶段名，每次运行的序列保持不变（不与span汇总的stage_seconds同名）
+        for name, (start, end) in self.timing.items():
+            metrics.set_gauge('graph_stage_seconds', end - start, graph=self.name, stage=name)
+            metrics.set_gauge('graph_stage_critical', int(name in path), graph=self.name, stage=name)
+        metrics.set_gauge('critical_path_seconds', total, graph=self.name)
+        chain = ' → '.join(f"{name} {self.timing[name][1] - self.timing[name][0]:.1f}s" for name in path)
+        print(f"⏱️  关键路径: {chain}（总耗时 {total:.1f}s，各阶段耗时合计 {busy:.1f}s）")
+
+
+# 确定播报时间窗口的起点
+def _broadcast_window_start(store: Optional['EventStore'], hours: float, since_last_broadcast: bool) -> datetime:
+    window_start = datetime.now(timezone.utc) - timedelta(hours=hours)
+    if since_last_broadcast and store:
+        last = store.last_broadcast()
+        if last:
+            window_start = last
+            print(f"🕘 播报上次播报（{last.astimezone().strftime('%m-%d %H:%M')}）以来的动态")
+    return window_start
+
+
+# 在阶段图中加入数据抓取阶段
+def add_collect_stages(graph: StageGraph, hours: float = 24, since_last_broadcast: bool = False,
+                       offline: bool = False) -> None:
+    """
+    加入 starred → events 链和与之并行的 trending 阶段；
+    未找到starred仓库时取消events及其下游阶段，trending抓取失败时以空列表继续
+    参数同collect_broadcast_data
+    """
+    def starred():
+        print("⭐ 获取你的starred仓库...")
+        repos = get_starred_repos()
+        print(f"📚 找到 {len(repos)} 个starred仓库")
+        if not repos:
+            print("⚠️  未找到starred仓库，请先在GitHub上star一些项目")
+            raise StageCancelled()
+        return repos
+
+    def events(starred=None):
+        store = EventStore() if EVENT_STORE_ENABLED or offline else None
+        try:
+            window_start = _broadcast_window_start(store, hours, since_last_broadcast)
+            if offline:
+                print("📦 离线模式：从本地事件库生成播报")
+                return store.query_events(window_start, per_repo_limit=10)
+
+            # 收集时间窗口内的重要事件
+            print("🔍 分析近期的重要动态...")
+            # 按活跃度挑选到期的仓库直到用完请求预算，并发抓取并根据响应头节流
+            scheduled = schedule_repo_polls(starred, store)
+            all_events = fetch_repos_events(scheduled, since=window_start, store=store)
+            if store:
+                # 新事件已入库，从事件库按窗口查询（包含之前运行已入库、本次未到期仓库的事件）
+                all_events = store.query_events(window_start, repos=[r['full_name'] for r in starred],
+                                                per_repo_limit=10)
+            return all_events
+        finally:
+            if store:
+                store.close()
+
+    if offline:
+        graph.add('events', events, label='读取本地事件库')
+        graph.add('trending', lambda: [])
+    else:
+        graph.add('starred', starred, label='获取starred仓库')
+        graph.add('events', events, deps=('starred',), label='获取仓库动态')
+        graph.add('trending', fetch_daily_trending, fallback=lambda: [], label='获取热门项目')
+
+
+# 抓取播报所需的数据
+def collect_broadcast_data(hours: float = 24, since_last_broadcast: bool = False,
+                           offline: bool = False) -> Optional[Tuple[List[RepoEvent], List[Dict[str, Any]]]]:
+    """
+    抓取starred仓库动态和trending（两者并行），未找到starred仓库时返回None
+    :param hours: 播报的时间窗口（小时）
+    :param since_last_broadcast: 以上一次播报时间作为窗口起点（需要事件库）
+    :param offline: 不访问网络，只用本地事件库中的数据生成播报
+    :return: (事件列表, trending仓库列表)
+    """
+    graph = StageGraph('collect')
+    add_collect_stages(graph, hours, since_last_broadcast, offline)
+    graph.run()
+    graph.report()
+    all_events = graph.result('events')
+    if all_events is None:
+        return None
+    return all_events, graph.result('trending')
+
+
+# 在阶段图中加入摘要和播报阶段
+def add_broadcast_stages(graph: StageGraph, language: str = 'auto', stream: bool = False,
+                         title: str = "📻 今日Git Radio播报内容:", done_message: str = "✅ 播报完成！",
+                         record: bool = True) -> None:
+    """
+    在已有 events / trending 阶段的图中加入：
+    tts（主线程，与数据抓取同时进行）、summary（出错时回退到简单摘要）和 playback（主线程，等待摘要和语音引擎）；
+    stream为True时不单独生成摘要，playback直接流式生成并播报
+    :param record: 生成摘要后在事件库中记录本次播报
+    """
+    def tts():
+        engine = init_tts_engine(language)
         print("🔊 语音引擎初始化成功")
-    except Exception as e:
-        print(f"❌ 语音引擎初始化失败: {e}")
+        return engine
+
+    graph.add('tts', tts, main_thread=True, label='语音引擎初始化')
+
+    if stream:
+        def stream_playback(tts, events, trending):
+            print("\n🎙️  开始流式播报...")
+            speak_streaming_summary(tts, events, trending, language, speed=1.0)
+            if record:
+                record_broadcast()
+            print(done_message)
+
+        graph.add('playback', stream_playback, deps=('tts', 'events', 'trending'), main_thread=True,
+                  label='语音播报')
         return
 
-    # 获取starred仓库
-    print("⭐ 获取你的starred仓库...")
-    repos = get_starred_repos()
-    print(f"📚 找到 {len(repos)} 个starred仓库")
-    
-    if not repos:
-        print("⚠️  未找到starred仓库，请先在GitHub上star一些项目")
+    def announce(summary):
+        if record:
+            record_broadcast()
+        print("\n" + "="*50)
+        print(title)
+        print("="*50)
+        print(summary)
+        print("="*50)
+        return summary
+
+    def summarize(events, trending):
+        print("🤖 生成智能摘要...")
+        return announce(summarize_with_gpt(events, trending, language))
+
+    def playback(tts, summary):
+        print("\n🎙️  开始语音播报...")
+        speak_with_tts(tts, summary, language, speed=1.0)
+        print(done_message)
+
+    graph.add('summary', summarize, deps=('events', 'trending'),
+              fallback=lambda events, trending: announce(generate_simple_summary(events, trending)),
+              label='摘要生成')
+    graph.add('playback', playback, deps=('tts', 'summary'), main_thread=True, label='语音播报')
+
+
+# 在事件库中记录一次播报（供 --since-last-broadcast 使用）
+def record_broadcast() -> None:
+    if not EVENT_STORE_ENABLED:
         return
+    store = EventStore()
+    try:
+        store.record_broadcast()
+    finally:
+        store.close()
 
-    # 收集过去24小时的重要事件
-    print("🔍 分析过去24小时的重要动态...")
-    all_events = []
-    
-    # 只检查最近更新的前10个仓库，避免API限制
-    recent_repos = sorted(repos, key=lambda x: x.get('updated_at', ''), reverse=True)[:10]
-    
-    for i, repo in enumerate(recent_repos):
-        owner, repo_name = repo['full_name'].split('/')
-        print(f"📊 检查 {owner}/{repo_name} ({i+1}/{len(recent_repos)})")
-        
-        events = get_repo_recent_events(owner, repo_name)
-        
-        if events:
-            all_events.extend(events)
-            print(f"   ✅ 发现 {len(events)} 个重要事件")
-        
-        # 避免触发GitHub API速率限制
-        if i < len(recent_repos) - 1:
-            time.sleep(0.5)
 
-    # 获取GitHub Trending仓库
-    print("🔥 获取今日GitHub热门项目...")
-    trending_repos = get_trending_repos()
-    print(f"📈 找到 {len(trending_repos)} 个热门项目")
+# 抓取数据并生成播报摘要
+def generate_broadcast_summary(hours: float = 24, since_last_broadcast: bool = False,
+                               offline: bool = False, language: str = 'auto') -> Optional[str]:
+    """抓取数据并生成摘要（不含语音部分），未找到starred仓库时返回None，参数同collect_broadcast_data"""
+    data = collect_broadcast_data(hours, since_last_broadcast, offline)
+    if data is None:
+        return None
+    all_events, trending_repos = data
 
     # 生成智能摘要
     print("🤖 生成智能摘要...")
-    summary = summarize_with_gpt(all_events, trending_repos)
+    summary = summarize_with_gpt(all_events, trending_repos, language)
+    record_broadcast()
+    return summary
+
+
+# 主程序
+def main(language='auto', hours: float = 24, since_last_broadcast: bool = False, offline: bool = False,
+         stream: bool = LLM_STREAM):
+    """
+    主程序入口：各阶段按依赖关系在StageGraph中执行，总耗时取决于最长的依赖链
+    :param hours: 播报的时间窗口（小时）
+    :param since_last_broadcast: 以上一次播报时间作为窗口起点（需要事件库）
+    :param offline: 不访问网络，只用本地事件库中的数据生成播报
+    :param stream: 流式生成摘要，模型输出一句就播报一句
+    """
+    start_run_metrics()
+    try:
+        print("🎵 Git Radio 启动中...")
     
-    print("\n" + "="*50)
-    print("📻 今日Git Radio播报内容:")
-    print("="*50)
-    print(summary)
-    print("="*50)
+        # 检查必要的环境变量
+        if not offline and (not GITHUB_TOKEN or GITHUB_TOKEN == "您的GitHub个人访问令牌"):
+            print("❌ 错误: 请在.env文件中设置真实的GITHUB_TOKEN")
+            print("💡 获取方法: https://github.com/settings/tokens")
+            print("🔧 或者运行演示模式: python3 git_radio.py --demo")
+            return
+    
+        # 语音引擎初始化、trending与 starred → events 链同时进行，摘要和播报等待各自的依赖
+        graph = StageGraph('broadcast')
+        add_collect_stages(graph, hours, since_last_broadcast, offline)
+        add_broadcast_stages(graph, language, stream=stream)
+        graph.run()
+        graph.report()
+        if graph.status['playback'] in ('ok', 'failed'):
+            print("\n🎵 Git Radio 播报结束，祝你有美好的一天！")
+    finally:
+        # 写出本次运行的JSON报告和Prometheus指标
+        export_run_metrics()
+
+
+# 常驻服务
+class RadioDaemon:
+    """
+    常驻服务模式：语音模型和GitHub客户端只加载一次，按固定间隔播报，
+    并在本地HTTP端口上提供接口：
+    - POST /broadcast  立即触发一次播报
+    - GET  /summary    最近一次播报的摘要（JSON）
+    - GET  /audio      最近一次播报的音频（wav，仅MeloTTS）
+    - GET  /health     服务状态
+    """
+
+    def __init__(self, language='auto', interval_minutes: float = 60, hours: float = 24,
+                 play: bool = True, host: str = '127.0.0.1', port: int = 8765):
+        self.language = language
+        self.interval = interval_minutes * 60
+        self.hours = hours
+        self.play = play
+        self.host = host
+        self.port = port
+        self.tts_engine = None
+        self.latest = {'summary': None, 'generated_at': None}
+        self._audio = None  # 最近一次摘要渲染出的wav，按需生成
+        self._lock = threading.Lock()
+        # 播放和/audio渲染共用同一个语音模型，模型推理不是线程安全的，需串行
+        self._tts_lock = threading.Lock()
+        self._trigger = threading.Event()
+        self._stopped = threading.Event()
+
+    # 执行一次播报（每次播报单独记录并导出运行指标）
+    def broadcast(self) -> Optional[str]:
+        start_run_metrics()
+        try:
+            summary = generate_broadcast_summary(self.hours, language=self.language)
+            if summary is None:
+                return None
+            with self._lock:
+                self.latest = {'summary': summary, 'generated_at': datetime.now(timezone.utc).isoformat()}
+                self._audio = None
+            print("📻 播报内容:\n" + summary)
+            if self.play and self.tts_engine:
+                try:
+                    with self._tts_lock:
+                        speak_with_tts(self.tts_engine, summary, self.language, speed=1.0)
+                except Exception as e:
+                    print(f"❌ 语音播报失败: {e}")
+            return summary
+        finally:
+            export_run_metrics()
+
+    # 最近一次播报的音频
+    def latest_audio(self) -> Optional[bytes]:
+        with self._lock:
+            summary, audio = self.latest['summary'], self._audio
+        # pyttsx3/say无法渲染音频文件，按无音频处理（/audio返回404而不是500）
+        if summary is None or not self.tts_engine or self.tts_engine.get('type') not in MELOTTS_ENGINE_TYPES:
+            return None
+        if audio is None:
+            with self._tts_lock:
+                # 等待模型期间其他请求可能已渲染好同一摘要
+                with self._lock:
+                    if self.latest['summary'] == summary and self._audio is not None:
+                        return self._audio
+                audio = render_wav_bytes(self.tts_engine, summary, self.language)
+            with self._lock:
+                if self.latest['summary'] == summary:
+                    self._audio = audio
+        return audio
+
+    # 请求立即播报
+    def trigger(self) -> None:
+        self._trigger.set()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._trigger.set()
 
-    # 语音播报
-    print("\n🎙️  开始语音播报...")
+    # 构建HTTP接口
+    def _make_server(self) -> ThreadingHTTPServer:
+        daemon = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status, body: bytes, content_type='application/json; charset=utf-8'):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _send_json(self, status, data):
+                self._send(status, json.dumps(data, ensure_ascii=False).encode('utf-8'))
+
+            def do_POST(self):
+                if self.path == '/broadcast':
+                    daemon.trigger()
+                    self._send_json(202, {'status': 'scheduled'})
+                else:
+                    self._send_json(404, {'error': 'not found'})
+
+            def do_GET(self):
+                if self.path == '/summary':
+                    # 只在锁内复制，慢客户端不会阻塞播报更新
+                    with daemon._lock:
+                        latest = dict(daemon.latest)
+                    self._send_json(200, latest)
+                elif self.path == '/audio':
+                    try:
+                        audio = daemon.latest_audio()
+                    except Exception as e:
+                        self._send_json(500, {'error': str(e)})
+                        return
+                    if audio is None:
+                        self._send_json(404, {'error': 'no audio available'})
+                    else:
+                        self._send(200, audio, 'audio/wav')
+                elif self.path == '/health':
+                    self._send_json(200, {'status': 'ok', 'tts': (daemon.tts_engine or {}).get('type')})
+                else:
+                    self._send_json(404, {'error': 'not found'})
+
+        return ThreadingHTTPServer((self.host, self.port), Handler)
+
+    # 启动服务（阻塞直到stop或Ctrl+C）
+    def run(self) -> None:
+        if not GITHUB_TOKEN or GITHUB_TOKEN == "您的GitHub个人访问令牌":
+            print("❌ 错误: 请在.env文件中设置真实的GITHUB_TOKEN")
+            return
+        print(f"🛰️ Git Radio 常驻服务启动，每 {self.interval / 60:g} 分钟播报一次")
+        tts_warmup = start_tts_warmup(self.language)
+        server = self._make_server()
+        threading.Thread(target=server.serve_forever, name='radio-http', daemon=True).start()
+        print(f"🌐 控制接口: http://{self.host}:{self.port} (POST /broadcast, GET /summary, GET /audio)")
+
+        try:
+            self.tts_engine = init_tts_engine(self.language, warmup=tts_warmup)
+            print("🔊 语音引擎初始化成功")
+        except Exception as e:
+            print(f"❌ 语音引擎初始化失败: {e}，仅生成文字摘要")
+
+        try:
+            while not self._stopped.is_set():
+                try:
+                    self.broadcast()
+                except Exception as e:
+                    print(f"❌ 播报失败: {e}")
+                # 等待下一次定时播报或HTTP触发
+                self._trigger.wait(self.interval)
+                self._trigger.clear()
+        except KeyboardInterrupt:
+            print("\n👋 收到中断信号，停止服务")
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+# 导出单个播报为音频文件（播客）
+def export_podcast(path: str, language: str = 'auto', hours: float = 24, since_last_broadcast: bool = False,
+                   offline: bool = False, workers: int = TTS_EXPORT_WORKERS) -> None:
+    """生成播报摘要并导出为 path（wav/opus/mp3），句子由多进程并行合成"""
+    start_run_metrics()
     try:
-        speak_with_tts(tts_engine, summary, language, speed=1.0)
-        print("✅ 播报完成！")
+        check_audio_export(path)
+        summary = generate_broadcast_summary(hours, since_last_broadcast, offline, language)
+        if summary is None:
+            return
+        print("📻 播报内容:\n" + summary)
+        print("🎙️  导出音频...")
+        export_broadcasts([(summary, path, language)], workers=workers)
+        print(f"✅ 已导出到 {path}")
     except Exception as e:
-        print(f"❌ 语音播报失败: {e}")
-    
-    print("\n🎵 Git Radio 播报结束，祝你有美好的一天！")
+        print(f"❌ 音频导出失败: {e}")
+    finally:
+        export_run_metrics()
+
+
+# 读取批量播报的用户列表
+def load_batch_users(path: str) -> List[Dict[str, Any]]:
+    """
+    读取JSON数组，每项为一个用户：
+    name: 用户名（用作输出文件名）；token 或 token_env: GitHub token或保存token的环境变量名；lang: 可选，播报语言
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        users = json.load(f)
+    for user in users:
+        if not user.get('token') and user.get('token_env'):
+            user['token'] = os.getenv(user['token_env'])
+        if not user.get('name') or not user.get('token'):
+            raise ValueError(f"用户配置缺少name或token: {user.get('name') or user}")
+    return users
+
+
+# 把仓库分配给star了它的用户token，使各token的请求量尽量均衡
+def assign_repos_to_tokens(user_repos: Dict[str, List[Dict[str, Any]]]) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    :param user_repos: 用户名 -> 该用户要播报的仓库列表
+    :return: 用户名 -> 用该用户token抓取的仓库列表（每个仓库只出现一次）
+    私有仓库只有star了它的用户能访问，因此只在这些用户之间分配；候选用户少的仓库先分配
+    """
+    stargazers = {}
+    repo_info = {}
+    for name, repos in user_repos.items():
+        for repo in repos:
+            stargazers.setdefault(repo['full_name'], []).append(name)
+            repo_info[repo['full_name']] = repo
+    assignment = {name: [] for name in user_repos}
+    for full_name in sorted(stargazers, key=lambda n: len(stargazers[n])):
+        owner = min(stargazers[full_name], key=lambda name: len(assignment[name]))
+        assignment[owner].append(repo_info[full_name])
+    return assignment
+
+
+# 批量播报：多个用户共享一次抓取
+def batch_broadcast(users: List[Dict[str, Any]], output_dir: str = 'broadcasts', hours: float = 24,
+                    language: str = 'auto', audio_format: str = 'wav',
+                    workers: int = TTS_EXPORT_WORKERS) -> None:
+    """
+    为一组用户生成各自的播报：取所有用户starred仓库的并集，每个仓库只抓取一次（用其中一位用户的token，
+    各token分担请求），trending只抓取一次，再按用户分别生成摘要和音频
+    输出 output_dir/<name>.txt 和 output_dir/<name>.<audio_format>（仅MeloTTS可渲染音频文件）
+    :param users: load_batch_users 返回的用户列表
+    :param hours: 播报的时间窗口（小时）
+    :param audio_format: wav / opus / mp3
+    :param workers: 合成进程数，大于1时所有用户的音频由进程池并行合成
+    """
+    print(f"🎵 Git Radio 批量播报：{len(users)} 位用户")
+    start_run_metrics()
+    # 多进程导出时模型在工作进程中加载，主进程不需要预热
+    tts_warmup = start_tts_warmup(language) if workers <= 1 else None
+    clients = {user['name']: GitHubClient(user['token']) for user in users}
+
+    # 并行获取每个用户的starred列表
+    print("⭐ 获取各用户的starred仓库...")
+    user_repos = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(len(users), GITHUB_MAX_WORKERS))) as executor:
+        futures = {executor.submit(get_starred_repos, clients[name]): name for name in clients}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                repos = future.result()
+            except Exception as e:
+                print(f"⚠️ 获取 {name} 的starred仓库失败: {e}")
+                repos = []
+            user_repos[name] = repos
+
+    window_start = datetime.now(timezone.utc) - timedelta(hours=hours)
+    store = EventStore() if EVENT_STORE_ENABLED else None
+    try:
+        # 在所有用户starred仓库的并集上按活跃度调度，每个token贡献一份请求预算
+        union = {repo['full_name']: repo for repos in user_repos.values() for repo in repos}
+        scheduled = {repo['full_name'] for repo in
+                     schedule_repo_polls(list(union.values()), store, budget=POLL_REQUEST_BUDGET * len(clients))}
+        assignment = assign_repos_to_tokens({name: [repo for repo in repos if repo['full_name'] in scheduled]
+                                             for name, repos in user_repos.items()})
+        total = sum(len(repos) for repos in user_repos.values())
+        print(f"📚 共 {total} 个用户-仓库组合，去重后 {len(union)} 个仓库，本次抓取 {len(scheduled)} 个")
+
+        # 各token并行抓取分配到的仓库，事件写入共享事件库
+        print("🔍 分析近期的重要动态...")
+        events_by_repo = {}
+        with ThreadPoolExecutor(max_workers=max(1, len(assignment))) as executor:
+            futures = [executor.submit(fetch_repos_events, repos, client=clients[name], since=window_start,
+                                       store=store)
+                       for name, repos in assignment.items() if repos]
+            for future in as_completed(futures):
+                for event in future.result():
+                    events_by_repo.setdefault(event.repo, []).append(event)
+
+        trending_repos = fetch_daily_trending(clients[users[0]['name']])
+
+        os.makedirs(output_dir, exist_ok=True)
+        jobs = []
+        for user in users:
+            name = user['name']
+            user_language = user.get('lang', language)
+            full_names = [repo['full_name'] for repo in user_repos.get(name, [])]
+            if store:
+                events = store.query_events(window_start, repos=full_names, per_repo_limit=10)
+            else:
+                events = [event for full_name in full_names for event in events_by_repo.get(full_name, [])]
+
+            print(f"🤖 生成 {name} 的摘要...")
+            summary = summarize_with_gpt(events, trending_repos, user_language)
+            with open(os.path.join(output_dir, f'{name}.txt'), 'w', encoding='utf-8') as f:
+                f.write(summary)
+            jobs.append((summary, os.path.join(output_dir, f'{name}.{audio_format}'), user_language))
+        if store:
+            store.record_broadcast()
+
+        # 所有用户的音频一起导出，句子在进程池中并行合成
+        print("🎙️  导出音频...")
+        try:
+            tts_engine = tts_warmup.result() if tts_warmup is not None else None
+            written = export_broadcasts(jobs, workers=workers, tts_engine=tts_engine)
+            print(f"✅ 已导出 {len(written)} 个音频文件到 {output_dir}")
+        except Exception as e:
+            print(f"⚠️ 音频导出失败，只输出文字稿: {e}")
+    finally:
+        if store:
+            store.close()
+        export_run_metrics()
+
+    print("\n🎵 Git Radio 批量播报结束！")
 
 
 # 演示模式数据
 def get_demo_data():
     """获取演示数据"""
     demo_events = [
-        {
-            'type': 'HotPullRequest',
-            'created_at': '2024-01-15T10:30:00Z',
-            'actor': {'login': 'developer123'},
-            'repo': {'name': 'microsoft/vscode'},
-            'payload': {
-                'title': 'Add new AI-powered code completion feature',
-                'comments': 15,
-                'state': 'open',
-                'url': 'https://github.com/microsoft/vscode/pull/12345'
-            }
-        },
-        {
-            'type': 'ReleaseEvent',
-            'created_at': '2024-01-15T09:15:00Z',
-            'actor': {'login': 'maintainer'},
-            'repo': {'name': 'facebook/react'},
-            'payload': {'tag_name': 'v18.3.0'}
-        },
-        {
-            'type': 'PullRequestEvent',
-            'created_at': '2024-01-15T08:45:00Z',
-            'actor': {'login': 'contributor'},
-            'repo': {'name': 'tensorflow/tensorflow'},
-            'payload': {'action': 'opened'}
-        }
+        RepoEvent.create('HotPullRequest', 'microsoft/vscode', 'developer123', '2024-01-15T10:30:00Z', payload={
+            'title': 'Add new AI-powered code completion feature',
+            'comments': 15,
+            'state': 'open',
+            'url': 'https://github.com/microsoft/vscode/pull/12345'
+        }),
+        RepoEvent.create('ReleaseEvent', 'facebook/react', 'maintainer', '2024-01-15T09:15:00Z',
+                         payload={'tag_name': 'v18.3.0'}),
+        RepoEvent.create('PullRequestEvent', 'tensorflow/tensorflow', 'contributor', '2024-01-15T08:45:00Z',
+                         payload={'action': 'opened'}),
     ]
     
     demo_trending = [
@@ -569,14 +3277,6 @@ def demo_mode(language='auto'):
     """演示模式"""
     print("🎵 Git Radio 演示模式启动中...")
     
-    # 初始化语音引擎
-    try:
-        tts_engine = init_tts_engine(language)
-        print("🔊 语音引擎初始化成功")
-    except Exception as e:
-        print(f"❌ 语音引擎初始化失败: {e}")
-        return
-    
     print("📚 使用演示数据模拟GitHub动态...")
     
     # 获取演示数据
@@ -585,23 +3285,16 @@ def demo_mode(language='auto'):
     print(f"🔍 模拟发现 {len(demo_events)} 个重要事件")
     print(f"🔥 模拟获取 {len(demo_trending)} 个热门项目")
     
-    # 生成智能摘要
-    print("🤖 生成演示摘要...")
-    summary = summarize_with_gpt(demo_events, demo_trending)
-    
-    print("\n" + "="*50)
-    print("📻 Git Radio 演示播报内容:")
-    print("="*50)
-    print(summary)
-    print("="*50)
-    
-    # 语音播报
-    print("\n🎙️  开始语音播报...")
-    try:
-        speak_with_tts(tts_engine, summary, language, speed=1.0)
-        print("✅ 演示播报完成！")
-    except Exception as e:
-        print(f"❌ 语音播报失败: {e}")
+    # 摘要生成与语音引擎初始化同时进行
+    graph = StageGraph('demo')
+    graph.add('events', lambda: demo_events)
+    graph.add('trending', lambda: demo_trending)
+    add_broadcast_stages(graph, language, title="📻 Git Radio 演示播报内容:", done_message="✅ 演示播报完成！",
+                         record=False)
+    graph.run()
+    graph.report()
+    if graph.status['playback'] not in ('ok', 'failed'):
+        return
     
     print("\n🎵 Git Radio 演示结束！")
     print("💡 要使用真实数据，请配置GitHub Token后运行: python3 git_radio.py")
@@ -615,11 +3308,36 @@ if __name__ == "__main__":
     parser.add_argument('--demo', action='store_true', help='运行演示模式')
     parser.add_argument('--lang', choices=['ZH', 'EN', 'auto'], default='auto', 
                        help='语音播报语言: zh(中文), en(英语), auto(自动检测)')
+    parser.add_argument('--hours', type=float, default=24, help='播报的时间窗口（小时），如6或168（周报）')
+    parser.add_argument('--since-last-broadcast', action='store_true', help='播报上一次播报以来的动态')
+    parser.add_argument('--offline', action='store_true', help='不访问网络，仅使用本地事件库生成播报')
+    parser.add_argument('--stream', action='store_true', default=LLM_STREAM,
+                        help='流式生成摘要，模型输出一句就播报一句')
+    parser.add_argument('--daemon', action='store_true', help='常驻服务模式：保持模型和连接池常驻，定时播报')
+    parser.add_argument('--interval', type=float, default=60, help='常驻模式下的播报间隔（分钟）')
+    parser.add_argument('--listen', default='127.0.0.1:8765', help='常驻模式控制接口的监听地址 host:port')
+    parser.add_argument('--no-play', action='store_true', help='常驻模式下只生成摘要，不播放语音')
+    parser.add_argument('--batch', metavar='USERS_JSON', help='批量播报模式：为JSON文件中的多位用户共享抓取并分别生成播报')
+    parser.add_argument('--output-dir', default='broadcasts', help='批量播报的输出目录')
+    parser.add_argument('--export', metavar='PATH', help='把播报导出为音频文件（.wav/.opus/.mp3）而不是播放')
+    parser.add_argument('--format', choices=['wav', 'opus', 'mp3'], default='wav', help='批量播报的音频格式')
+    parser.add_argument('--workers', type=int, default=TTS_EXPORT_WORKERS, help='导出音频时的合成进程数')
     
     args = parser.parse_args()
     
     # 根据参数运行相应模式
     if args.demo:
         demo_mode(args.lang)
+    elif args.batch:
+        batch_broadcast(load_batch_users(args.batch), output_dir=args.output_dir, hours=args.hours,
+                        language=args.lang, audio_format=args.format, workers=args.workers)
+    elif args.export:
+        export_podcast(args.export, args.lang, hours=args.hours, since_last_broadcast=args.since_last_broadcast,
+                       offline=args.offline, workers=args.workers)
+    elif args.daemon:
+        host, _, port = args.listen.rpartition(':')
+        RadioDaemon(args.lang, interval_minutes=args.interval, hours=args.hours, play=not args.no_play,
+                    host=host or '127.0.0.1', port=int(port)).run()
     else:
-        main(args.lang)
\ No newline at end of file
+        main(args.lang, hours=args.hours, since_last_broadcast=args.since_last_broadcast, offline=args.offline,
+             stream=args.stream)
\ No newline at end of file